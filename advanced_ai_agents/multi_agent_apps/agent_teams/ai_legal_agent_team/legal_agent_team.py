@@ -1,11 +1,11 @@
 import streamlit as st
 from agno.agent import Agent
-from agno.knowledge.pdf import PDFKnowledgeBase, PDFReader
+from agno.knowledge.agent import AgentKnowledge
+from agno.document.reader.pdf_reader import PDFReader
 from agno.vectordb.qdrant import Qdrant
 from agno.tools.duckduckgo import DuckDuckGoTools
 from agno.models.openai import OpenAIChat
 from agno.embedder.openai import OpenAIEmbedder
-import tempfile
 import os
 from agno.document.chunking.document import DocumentChunking
 
@@ -57,8 +57,11 @@ def process_document(uploaded_file, vector_db: Qdrant):
         uploaded_file: Streamlit uploaded file object
         vector_db (Qdrant): Initialized Qdrant instance from Agno
     
+    The PDF is read straight from the uploaded file's in-memory buffer, so no
+    temporary file is written.
+
     Returns:
-        PDFKnowledgeBase: Initialized knowledge base with processed documents
+        AgentKnowledge: Initialized knowledge base with processed documents
     """
     if not st.session_state.openai_api_key:
         raise ValueError("OpenAI API key not provided")
@@ -66,38 +69,32 @@ def process_document(uploaded_file, vector_db: Qdrant):
     os.environ['OPENAI_API_KEY'] = st.session_state.openai_api_key
     
     try:
-        # Save the uploaded file to a temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(uploaded_file.getvalue())
-            temp_file_path = temp_file.name
-        
         st.info("Loading and processing document...")
         
-        # Create a PDFKnowledgeBase with the vector_db
-        knowledge_base = PDFKnowledgeBase(
-            path=temp_file_path,  # Single string path, not a list
-            vector_db=vector_db,
-            reader=PDFReader(),
+        # The upload is a named in-memory stream, which PDFReader reads directly
+        reader = PDFReader(
+            chunk=True,
             chunking_strategy=DocumentChunking(
                 chunk_size=1000,
                 overlap=200
             )
         )
+        uploaded_file.seek(0)
+        documents = reader.read(uploaded_file)
         
-        # Load the documents into the knowledge base
+        knowledge_base = AgentKnowledge(vector_db=vector_db)
+        
+        # Load the documents into the knowledge base, replacing the previous document's collection
         with st.spinner('📤 Loading documents into knowledge base...'):
             try:
-                knowledge_base.load(recreate=True, upsert=True)
+                if vector_db.exists():
+                    vector_db.drop()
+                vector_db.create()
+                knowledge_base.load_documents(documents, upsert=True)
                 st.success("✅ Documents stored successfully!")
             except Exception as e:
                 st.error(f"Error loading documents: {str(e)}")
                 raise
-        
-        # Clean up the temporary file
-        try:
-            os.unlink(temp_file_path)
-        except Exception:
-            pass
             
         return knowledge_base
             
@@ -1,9 +1,9 @@
+import os
+import sys
+from urllib.parse import urlparse
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
-from uuid import uuid4
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.tools.retriever import create_retriever_tool
 
 from typing import Annotated, Literal, Sequence
@@ -24,6 +24,12 @@ from langgraph.prebuilt import ToolNode, tools_condition
 
 import streamlit as st
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_utils.embedding_cache import CachedEmbeddings
+from blog_crawler import ChunkConfig, crawl_blog
+
+COLLECTION_NAME = "qdrant_db"
+
 st.set_page_config(page_title="AI Blog Search", page_icon=":mag_right:")
 st.header(":blue[Agentic RAG with LangGraph:] :green[AI Blog Search]")
 
@@ -53,6 +59,17 @@ def set_sidebar():
             else:
                 st.warning("Please fill all API fields")
 
+        st.subheader("Crawl Settings")
+        st.session_state.crawl_site = st.checkbox(
+            "Crawl the whole blog", value=True,
+            help="Discover posts through the blog's RSS/Atom feed or sitemap. Otherwise only the URL given is added."
+        )
+        st.session_state.max_posts = st.number_input("Max posts", min_value=1, max_value=500, value=50)
+        st.session_state.chunk_size = st.number_input("Chunk size (tokens)", min_value=50, max_value=2000,
+                                                      value=400, step=50)
+        st.session_state.chunk_overlap = st.number_input("Chunk overlap (tokens)", min_value=0, max_value=500,
+                                                         value=50, step=10)
+
 def initialize_components():
     """Initialize components that require API keys"""
     if not all([st.session_state.qdrant_host, 
@@ -61,11 +78,11 @@ def initialize_components():
         return None, None, None
 
     try:
-        # Initialize embedding model with API key
-        embedding_model = GoogleGenerativeAIEmbeddings(
+        # Initialize embedding model with API key, backed by the local embedding cache
+        embedding_model = CachedEmbeddings(GoogleGenerativeAIEmbeddings(
             model="models/embedding-001",
             google_api_key=st.session_state.gemini_api_key
-        )
+        ))
 
         # Initialize Qdrant client
         client = QdrantClient(
@@ -76,7 +93,7 @@ def initialize_components():
         # Initialize vector store
         db = QdrantVectorStore(
             client=client,
-            collection_name="qdrant_db",
+            collection_name=COLLECTION_NAME,
             embedding=embedding_model
         )
 
@@ -295,17 +312,15 @@ def generate_message(graph, inputs):
 
 def add_documents_to_qdrant(url, db):
     try:
-        docs = WebBaseLoader(url).load()
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            chunk_size=100, chunk_overlap=50
-        )
-        doc_chunks = text_splitter.split_documents(docs)
-        uuids = [str(uuid4()) for _ in range(len(doc_chunks))]
-        db.add_documents(documents=doc_chunks, ids=uuids)
-        return True
+        config = ChunkConfig(int(st.session_state.chunk_size), int(st.session_state.chunk_overlap))
+        # Crawl state is kept per Qdrant host and collection, since it records which chunks they hold
+        host = urlparse(st.session_state.qdrant_host).netloc or st.session_state.qdrant_host
+        state_path = f"crawl_state_{host.replace(':', '_')}_{COLLECTION_NAME}.json"
+        return crawl_blog(url, db, config=config, crawl_site=st.session_state.crawl_site,
+                          max_posts=int(st.session_state.max_posts), state_path=state_path)
     except Exception as e:
         st.error(f"Error adding documents: {str(e)}")
-        return False
+        return None
 
 def main():
     set_sidebar()
@@ -338,9 +353,19 @@ def main():
     )
     if st.button("Enter URL"):
         if url:
-            with st.spinner("Processing documents..."):
-                if add_documents_to_qdrant(url, db):
-                    st.success("Documents added successfully!")
+            with st.spinner("Crawling blog..."):
+                report = add_documents_to_qdrant(url, db)
+                if report:
+                    st.success(f"Crawled {report.discovered} posts: {report.updated} new or changed, "
+                               f"{report.not_modified + report.unchanged} unchanged")
+                    st.caption(f"Chunks: {report.chunks_added} embedded, {report.chunks_kept} already stored, "
+                               f"{report.chunks_deleted} stale deleted. "
+                               f"Collection now holds {client.count(COLLECTION_NAME).count} vectors. "
+                               f"Fetch {report.fetch_seconds:.1f}s, indexing {report.index_seconds:.1f}s")
+                    if report.failed:
+                        st.warning(f"Failed to fetch {len(report.failed)} posts: {', '.join(report.failed[:5])}")
+                    st.caption(f"Embedding cache hit rate: {embedding_model.hit_rate:.0%} "
+                               f"({embedding_model.hits} hits, {embedding_model.misses} misses)")
                 else:
                     st.error("Failed to add documents")
         else:
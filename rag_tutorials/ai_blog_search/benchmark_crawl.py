@@ -0,0 +1,109 @@
+"""Measure the effect of chunk size and incremental crawling on a blog's index.
+
+For each chunk size, the blog is crawled into a fresh collection and then
+crawled again. The table reports:
+
+- posts: posts discovered and fetched
+- vectors: points in the collection after the first crawl
+- first_s / recrawl_s: wall time of each crawl, including embedding
+- recrawl_embedded: chunks embedded by the second crawl (0 when nothing changed)
+- p50/p95_ms: similarity search latency (k=5) over the queries, excluding query embedding
+
+`--chunk-sizes 100 --single-post` matches the app's previous chunking. It
+inserted chunks under random IDs, so every re-add embedded and stored all
+of them again; recrawl_embedded shows what a re-add costs now.
+
+Usage:
+    export GOOGLE_API_KEY=...
+    python benchmark_crawl.py https://lilianweng.github.io/ --chunk-sizes 100 400 800
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_qdrant import QdrantVectorStore
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from blog_crawler import ChunkConfig, crawl_blog
+
+DEFAULT_QUERIES = [
+    "What are the types of agent memory?",
+    "How does chain of thought prompting work?",
+    "What is an adversarial attack on an LLM?",
+    "How is retrieval used to reduce hallucination?",
+    "What is the difference between few-shot and zero-shot prompting?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunk size and incremental blog crawls")
+    parser.add_argument("url", help="Blog, feed, sitemap or post URL")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[100, 400, 800])
+    parser.add_argument("--overlap-ratio", type=float, default=0.125, help="Chunk overlap as a share of chunk size")
+    parser.add_argument("--max-posts", type=int, default=20)
+    parser.add_argument("--single-post", action="store_true", help="Only add the URL given, like the app used to")
+    parser.add_argument("--qdrant-url", default=os.environ.get("QDRANT_URL", ":memory:"))
+    parser.add_argument("--qdrant-api-key", default=os.environ.get("QDRANT_API_KEY"))
+    parser.add_argument("--searches", type=int, default=20, help="Timed searches per query")
+    args = parser.parse_args()
+
+    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+    query_vectors = [embeddings.embed_query(query) for query in DEFAULT_QUERIES]
+    client = QdrantClient(location=args.qdrant_url, api_key=args.qdrant_api_key)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as state_dir:
+        for chunk_size in args.chunk_sizes:
+            collection_name = f"benchmark_crawl_{chunk_size}"
+            if client.collection_exists(collection_name):
+                client.delete_collection(collection_name)
+            client.create_collection(collection_name, vectors_config=VectorParams(
+                size=len(query_vectors[0]), distance=Distance.COSINE))
+            db = QdrantVectorStore(client=client, collection_name=collection_name, embedding=embeddings)
+            config = ChunkConfig(chunk_size, int(chunk_size * args.overlap_ratio))
+            state_path = os.path.join(state_dir, f"{collection_name}.json")
+
+            def crawl():
+                start = time.perf_counter()
+                report = crawl_blog(args.url, db, config=config, crawl_site=not args.single_post,
+                                    max_posts=args.max_posts, state_path=state_path)
+                return report, time.perf_counter() - start
+
+            first, first_seconds = crawl()
+            vectors = client.count(collection_name).count
+            second, second_seconds = crawl()
+
+            latencies = []
+            for _ in range(args.searches):
+                for vector in query_vectors:
+                    start = time.perf_counter()
+                    db.similarity_search_by_vector(vector, k=5)
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+            rows.append({
+                "chunk": chunk_size,
+                "posts": first.discovered,
+                "vectors": vectors,
+                "first_s": round(first_seconds, 1),
+                "recrawl_s": round(second_seconds, 1),
+                "recrawl_embedded": second.chunks_added,
+                "p50_ms": round(statistics.median(latencies), 2),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            })
+            client.delete_collection(collection_name)
+
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(row[c])) for row in rows)) for c in columns}
+    print(" | ".join(c.ljust(widths[c]) for c in columns))
+    print("-+-".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print(" | ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
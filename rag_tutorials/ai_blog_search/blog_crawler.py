@@ -0,0 +1,282 @@
+"""Incremental, sitemap-aware crawl of a blog into a Qdrant collection.
+
+Posts are discovered from the blog's RSS/Atom feed or sitemap: the URL given
+can be a feed, a sitemap, or a page, in which case its advertised feeds and
+the usual feed locations are tried. The posts are then fetched concurrently
+over one shared async HTTP client. A post crawled before is revalidated with
+its saved ETag / Last-Modified validators, so an unchanged post costs a 304.
+
+Chunks get deterministic IDs, derived from the post URL and the chunk text:
+- Re-adding a blog only embeds the chunks of new or changed posts.
+- Chunks already in the collection are never embedded twice.
+- Chunks of a changed post that no longer exist are deleted.
+
+Per-post validators, content hashes and chunk IDs are kept in a JSON state
+file next to the app.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import httpx
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# Tried in order when the URL given is a page that advertises no feed
+FEED_PATHS = ("index.xml", "feed.xml", "rss.xml", "atom.xml", "feed", "sitemap.xml")
+FEED_TYPES = ("application/rss+xml", "application/atom+xml")
+
+
+@dataclass
+class ChunkConfig:
+    chunk_size: int = 400  # tokens
+    chunk_overlap: int = 50
+
+    def key(self) -> str:
+        return f"{self.chunk_size}/{self.chunk_overlap}"
+
+
+@dataclass
+class PageFetch:
+    url: str
+    status: str  # "fetched", "not_modified" or "failed"
+    text: str = ""
+    title: str = ""
+    etag: str = ""
+    last_modified: str = ""
+    error: str = ""
+
+
+@dataclass
+class CrawlReport:
+    discovered: int = 0
+    not_modified: int = 0  # Revalidated with a 304
+    unchanged: int = 0  # Downloaded, but the text had not changed
+    updated: int = 0  # New or changed posts, re-chunked
+    failed: List[str] = field(default_factory=list)
+    chunks_added: int = 0  # Embedded and inserted
+    chunks_kept: int = 0  # Already in the collection
+    chunks_deleted: int = 0  # Stale chunks of changed posts
+    fetch_seconds: float = 0.0
+    index_seconds: float = 0.0
+
+
+def chunk_id(url: str, text: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, url + "\n" + hashlib.sha256(text.encode("utf-8")).hexdigest()))
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _parse_feed(content: bytes) -> Optional[Tuple[List[str], List[str]]]:
+    """(post URLs, child sitemap URLs) of a sitemap, sitemap index, RSS or Atom feed; None for anything else."""
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError:
+        return None
+    kind = _local_name(root.tag)
+    elements = list(root.iter())
+    if kind == "urlset":
+        return [e.text.strip() for e in elements if _local_name(e.tag) == "loc" and e.text], []
+    if kind == "sitemapindex":
+        return [], [e.text.strip() for e in elements if _local_name(e.tag) == "loc" and e.text]
+    if kind == "rss":
+        return [link.text.strip() for item in elements if _local_name(item.tag) == "item"
+                for link in item if _local_name(link.tag) == "link" and link.text], []
+    if kind == "feed":
+        return [link.get("href") for entry in elements if _local_name(entry.tag) == "entry"
+                for link in entry if _local_name(link.tag) == "link" and link.get("href")
+                and link.get("rel", "alternate") == "alternate"], []
+    return None
+
+
+async def _find_feed(client: httpx.AsyncClient, url: str) -> Tuple[bool, Optional[Tuple[List[str], List[str]]]]:
+    """Feed or sitemap for `url`, and whether `url` itself is a page rather than a feed."""
+    response = await client.get(url)
+    response.raise_for_status()
+    parsed = _parse_feed(response.content)
+    if parsed is not None:
+        return False, parsed
+
+    soup = BeautifulSoup(response.text, "html.parser")
+    candidates = [urljoin(url, link["href"]) for link in soup.find_all("link", href=True)
+                  if link.get("type") in FEED_TYPES]
+    origin = "{0.scheme}://{0.netloc}/".format(urlparse(url))
+    candidates += [urljoin(origin, path) for path in FEED_PATHS]
+    for candidate in dict.fromkeys(candidates):
+        try:
+            response = await client.get(candidate)
+            if response.status_code != 200:
+                continue
+        except httpx.HTTPError:
+            continue
+        parsed = _parse_feed(response.content)
+        if parsed and (parsed[0] or parsed[1]):
+            return True, parsed
+    return True, None
+
+
+async def discover_posts(client: httpx.AsyncClient, url: str, max_posts: int = 50) -> List[str]:
+    """Post URLs on the same site as `url`, in feed order. A page URL comes first."""
+    is_page, parsed = await _find_feed(client, url)
+    posts, sitemaps = parsed if parsed else ([], [])
+    # Follow sitemap indexes two levels down, fetching each level's sitemaps concurrently
+    for _ in range(2):
+        if not sitemaps:
+            break
+        responses = await asyncio.gather(*(client.get(sitemap) for sitemap in sitemaps), return_exceptions=True)
+        sitemaps = []
+        for response in responses:
+            if isinstance(response, httpx.Response) and response.status_code == 200:
+                child = _parse_feed(response.content)
+                if child:
+                    posts += child[0]
+                    sitemaps += child[1]
+
+    host = urlparse(url).netloc
+    posts = [post for post in posts if urlparse(post).netloc == host]
+    if is_page:
+        posts.insert(0, url)
+    return list(dict.fromkeys(posts))[:max_posts]
+
+
+def _extract(html: str) -> Tuple[str, str]:
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(["script", "style", "noscript"]):
+        element.decompose()
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    return soup.get_text("\n", strip=True), title
+
+
+async def _fetch_page(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str,
+                      saved: Dict) -> PageFetch:
+    headers = {}
+    if saved.get("etag"):
+        headers["If-None-Match"] = saved["etag"]
+    if saved.get("last_modified"):
+        headers["If-Modified-Since"] = saved["last_modified"]
+    async with semaphore:
+        try:
+            response = await client.get(url, headers=headers)
+            if response.status_code == 304 and saved:
+                return PageFetch(url, "not_modified")
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            return PageFetch(url, "failed", error=str(e))
+    text, title = _extract(response.text)
+    return PageFetch(url, "fetched", text, title, response.headers.get("ETag", ""),
+                     response.headers.get("Last-Modified", ""))
+
+
+async def fetch_posts(url: str, state: Dict[str, Dict], config: ChunkConfig, crawl_site: bool = True,
+                      max_posts: int = 50, concurrency: int = 8, timeout: float = 30.0) -> List[PageFetch]:
+    """Discover the posts of a blog (or take `url` alone) and fetch them concurrently."""
+    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+        posts = await discover_posts(client, url, max_posts) if crawl_site else [url]
+        semaphore = asyncio.Semaphore(concurrency)
+        # Posts chunked with another chunk config must be re-chunked, so they are not revalidated
+        saved = {post: state[post] for post in posts if state.get(post, {}).get("chunk_config") == config.key()}
+        return list(await asyncio.gather(*(_fetch_page(client, semaphore, post, saved.get(post, {}))
+                                           for post in posts)))
+
+
+def _load_state(path: str) -> Dict[str, Dict]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(path: str, state: Dict[str, Dict]):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def _existing_ids(db, ids: List[str]) -> set:
+    existing = set()
+    for start in range(0, len(ids), 256):
+        points = db.client.retrieve(db.collection_name, ids=ids[start:start + 256],
+                                    with_payload=False, with_vectors=False)
+        existing.update(str(point.id) for point in points)
+    return existing
+
+
+def crawl_blog(url: str, db, *, config: ChunkConfig = ChunkConfig(), crawl_site: bool = True,
+               max_posts: int = 50, state_path: str = "crawl_state.json", concurrency: int = 8,
+               on_progress: Optional[Callable[[str], None]] = None) -> CrawlReport:
+    """Add a blog's new and changed posts to a `QdrantVectorStore`, embedding only chunks it does not hold yet."""
+    report = CrawlReport()
+    state = _load_state(state_path)
+    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        chunk_size=config.chunk_size, chunk_overlap=config.chunk_overlap
+    )
+
+    start = time.perf_counter()
+    fetches = asyncio.run(fetch_posts(url, state, config, crawl_site, max_posts, concurrency))
+    report.discovered = len(fetches)
+    report.fetch_seconds = time.perf_counter() - start
+    if on_progress:
+        on_progress(f"Fetched {len(fetches)} posts in {report.fetch_seconds:.1f}s")
+
+    start = time.perf_counter()
+    for page in fetches:
+        saved = state.get(page.url, {})
+        if page.status == "failed":
+            report.failed.append(page.url)
+            continue
+        if page.status == "not_modified":
+            report.not_modified += 1
+            report.chunks_kept += len(saved.get("chunk_ids", []))
+            continue
+
+        content_hash = hashlib.sha256(page.text.encode("utf-8")).hexdigest()
+        entry = {"etag": page.etag, "last_modified": page.last_modified, "content_hash": content_hash,
+                 "chunk_config": config.key()}
+        if saved.get("content_hash") == content_hash and saved.get("chunk_config") == config.key():
+            report.unchanged += 1
+            report.chunks_kept += len(saved.get("chunk_ids", []))
+            state[page.url] = {**entry, "chunk_ids": saved.get("chunk_ids", [])}
+            continue
+
+        report.updated += 1
+        chunks = {}
+        for text in splitter.split_text(page.text):
+            # Identical chunks within a post share an ID, so they are stored once
+            chunks.setdefault(chunk_id(page.url, text), text)
+        ids = list(chunks)
+        existing = _existing_ids(db, ids)
+        new_ids = [i for i in ids if i not in existing]
+        if new_ids:
+            db.add_documents(
+                documents=[Document(page_content=chunks[i], metadata={"source": page.url, "title": page.title})
+                           for i in new_ids],
+                ids=new_ids,
+            )
+        stale = [i for i in saved.get("chunk_ids", []) if i not in chunks]
+        if stale:
+            db.delete(ids=stale)
+        report.chunks_added += len(new_ids)
+        report.chunks_kept += len(existing)
+        report.chunks_deleted += len(stale)
+        state[page.url] = {**entry, "chunk_ids": ids}
+        # Saved after each post, so an interrupted crawl does not redo the posts already indexed
+        _save_state(state_path, state)
+        if on_progress:
+            on_progress(f"Indexed {page.url}: {len(new_ids)} new chunks")
+
+    _save_state(state_path, state)
+    report.index_seconds = time.perf_counter() - start
+    return report
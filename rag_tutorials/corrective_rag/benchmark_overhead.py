@@ -0,0 +1,110 @@
+"""Benchmark per-question graph overhead, excluding model latency.
+
+Compares the old behaviour (embeddings, Qdrant client, Claude clients, prompts
+and chains rebuilt on every question, graph compiled on every rerun) with the
+cached resource registry. No network calls are made: clients are only
+constructed, and the graph runs with no-op nodes.
+
+Usage:
+    python benchmark_overhead.py --questions 50
+"""
+import argparse
+import statistics
+import time
+from functools import lru_cache
+from typing import Dict, TypedDict
+
+from langgraph.graph import END, StateGraph
+
+from resources import ResourceConfig, build_resources
+
+CONFIG = ResourceConfig(
+    anthropic_api_key="sk-ant-benchmark",
+    openai_api_key="sk-benchmark",
+    qdrant_url="http://localhost:6333",
+)
+
+
+class GraphState(TypedDict):
+    keys: Dict[str, any]
+
+
+def _noop(state, config):
+    return {"keys": {**state["keys"], "documents": [], "run_web_search": "No", "generation": ""}}
+
+
+def compile_graph():
+    """Same topology as the corrective RAG workflow, with no-op nodes."""
+    workflow = StateGraph(GraphState)
+    for name in ["retrieve", "grade_documents", "generate", "transform_query", "web_search"]:
+        workflow.add_node(name, _noop)
+    workflow.set_entry_point("retrieve")
+    workflow.add_edge("retrieve", "grade_documents")
+    workflow.add_conditional_edges(
+        "grade_documents",
+        lambda state: "transform_query" if state["keys"]["run_web_search"] == "Yes" else "generate",
+        {"transform_query": "transform_query", "generate": "generate"},
+    )
+    workflow.add_edge("transform_query", "web_search")
+    workflow.add_edge("web_search", "generate")
+    workflow.add_edge("generate", END)
+    return workflow.compile()
+
+
+@lru_cache(maxsize=None)
+def cached_resources(config: ResourceConfig):
+    return build_resources(config)
+
+
+@lru_cache(maxsize=None)
+def cached_graph():
+    return compile_graph()
+
+
+def run_question(app, resources):
+    inputs = {"keys": {"question": "What are the ablation studies?"}}
+    for _ in app.stream(inputs, config={"configurable": {"resources": resources}}):
+        pass
+
+
+def per_question_uncached():
+    # Every rerun compiled the graph and rebuilt every client and chain
+    app = compile_graph()
+    resources = build_resources(CONFIG)
+    run_question(app, resources)
+
+
+def per_question_cached():
+    run_question(cached_graph(), cached_resources(CONFIG))
+
+
+def measure(fn, questions: int) -> list:
+    timings = []
+    for _ in range(questions):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=50)
+    args = parser.parse_args()
+
+    # Warm up imports and lazy module state so neither side pays for them
+    per_question_uncached()
+    per_question_cached()
+
+    rows = [
+        ("rebuild per question", measure(per_question_uncached, args.questions)),
+        ("resource registry", measure(per_question_cached, args.questions)),
+    ]
+
+    print(f"{'mode':<24}{'mean ms':>10}{'p50 ms':>10}{'max ms':>10}")
+    for name, timings in rows:
+        print(f"{name:<24}{statistics.mean(timings):>10.2f}{statistics.median(timings):>10.2f}{max(timings):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 from langchain import hub
 from langchain.output_parsers import PydanticOutputParser
-from langchain_core.output_parsers import StrOutputParser
 from langchain.schema import Document
 from pydantic import BaseModel, Field
 import streamlit as st
@@ -8,26 +7,42 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import PyPDFLoader, TextLoader, WebBaseLoader
 from langchain_community.tools import TavilySearchResults
 from langchain_community.vectorstores import Qdrant
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage        
 from langgraph.graph import END, StateGraph
-from typing import Dict, TypedDict
-from langchain_core.prompts import PromptTemplate
+from typing import Dict, List, TypedDict
 import pprint
+import re
+import json
+import asyncio
 import yaml
 import nest_asyncio
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import uuid
 import tempfile
 import os
-from langchain_anthropic import ChatAnthropic
 from tenacity import retry, stop_after_attempt, wait_exponential
+from resources import Resources, ResourceConfig, build_resources, resources_from_config
+from tracing import GraphTracer, traced, waterfall_rows
+import altair as alt
 
 
 nest_asyncio.apply()
 
 retriever = None
 
+GRADING_MODES = ["Sequential", "Batched", "Concurrent"]
+
+TRACE_LOG_PATH = "crag_traces.jsonl"
+
+COLLECTION_NAME = "rag-qdrant"
+EMBEDDING_DIM = 1536
+EMBED_BATCH_SIZE = 64
+EMBED_CONCURRENCY = 4
+
 def initialize_session_state():
     """Initialize session state variables for API keys and URLs."""
     if 'initialized' not in st.session_state:
@@ -39,6 +54,11 @@ def initialize_session_state():
         st.session_state.qdrant_api_key = ""
         st.session_state.qdrant_url = "http://localhost:6333"
         st.session_state.doc_url = "https://arxiv.org/pdf/2307.09288.pdf"  
+        st.session_state.grading_mode = "Batched"
+        st.session_state.grading_concurrency = 4
+        # source_id -> number of chunks stored in Qdrant for that source
+        st.session_state.indexed_sources = {}
+        st.session_state.save_traces = False
         
 def setup_sidebar():
     """Setup sidebar for API keys and configuration."""
@@ -50,6 +70,24 @@ def setup_sidebar():
         st.session_state.qdrant_url = st.text_input("Qdrant URL", value=st.session_state.qdrant_url)
         st.session_state.qdrant_api_key = st.text_input("Qdrant API Key", value=st.session_state.qdrant_api_key, type="password")
         st.session_state.doc_url = st.text_input("Document URL", value=st.session_state.doc_url)
+
+        st.subheader("Relevance Grading")
+        st.session_state.grading_mode = st.selectbox(
+            "Grading mode",
+            GRADING_MODES,
+            index=GRADING_MODES.index(st.session_state.grading_mode),
+            help="Sequential: one call per document. Batched: one structured call for all documents. "
+                 "Concurrent: one call per document, run in parallel."
+        )
+        if st.session_state.grading_mode == "Concurrent":
+            st.session_state.grading_concurrency = st.slider(
+                "Max concurrent grading calls", 1, 16, st.session_state.grading_concurrency
+            )
+
+        st.session_state.save_traces = st.checkbox(
+            f"Append traces to {TRACE_LOG_PATH}", value=st.session_state.save_traces,
+            help="Each question's per-node trace is written as one JSON line for offline profiling"
+        )
         
         if not all([st.session_state.openai_api_key, st.session_state.anthropic_api_key, st.session_state.qdrant_url]):
             st.warning("Please provide the required API keys and URLs")
@@ -65,23 +103,30 @@ openai_api_key = st.session_state.openai_api_key
 tavily_api_key = st.session_state.tavily_api_key
 anthropic_api_key = st.session_state.anthropic_api_key
 
-# Update embeddings initialization
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    api_key=st.session_state.openai_api_key
-)
 
-# Update Qdrant client initialization
-client = QdrantClient(
-    url=st.session_state.qdrant_url,
-    api_key=st.session_state.qdrant_api_key
+@st.cache_resource(show_spinner=False)
+def get_resources(anthropic_api_key: str, openai_api_key: str, qdrant_url: str, qdrant_api_key: str) -> Resources:
+    """Build LLM clients, chains and vector-store handles once per configuration."""
+    return build_resources(ResourceConfig(
+        anthropic_api_key=anthropic_api_key,
+        openai_api_key=openai_api_key,
+        qdrant_url=qdrant_url,
+        qdrant_api_key=qdrant_api_key,
+    ))
+
+
+resources = get_resources(
+    anthropic_api_key,
+    openai_api_key,
+    st.session_state.qdrant_url,
+    st.session_state.qdrant_api_key,
 )
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def execute_tavily_search(tool, query):
     return tool.invoke({"query": query})
 
-def web_search(state):
+def web_search(state, config):
     """Web search based on the re-phrased question using Tavily API."""
     print("~-web search-~")
     state_dict = state["keys"]
@@ -171,24 +216,101 @@ def load_documents(file_or_url: str, is_url: bool = True) -> list:
         st.error(f"Error loading document: {str(e)}")
         return []
 
+def ensure_collection(client: QdrantClient, collection_name: str = COLLECTION_NAME):
+    """Create the collection once; it is kept across reruns and documents."""
+    if not client.collection_exists(collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=EMBEDDING_DIM, distance=Distance.COSINE),
+        )
+
+
+def chunk_id(source_id: str, content_hash: str) -> str:
+    """Deterministic point ID for a chunk of a given source."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source_id}:{content_hash}"))
+
+
+def embed_in_batches(embeddings, texts: List[str]) -> List[List[float]]:
+    """Embed texts in fixed-size batches with a bounded number of requests in flight."""
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as executor:
+        results = executor.map(embeddings.embed_documents, batches)
+    return [vector for batch in results for vector in batch]
+
+
+def index_documents(client: QdrantClient, embeddings, splits: list, source_id: str,
+                    collection_name: str = COLLECTION_NAME) -> tuple:
+    """Upsert only the chunks of `source_id` that are not already stored, and
+    delete its chunks that are no longer in `splits` (e.g. a re-fetched page).
+
+    Returns (added, skipped, deleted) chunk counts.
+    """
+    chunks = {}
+    for doc in splits:
+        content_hash = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+        chunks.setdefault(chunk_id(source_id, content_hash), (content_hash, doc))
+
+    ids = list(chunks)
+    existing = set()
+    for i in range(0, len(ids), 256):
+        points = client.retrieve(collection_name, ids=ids[i:i + 256], with_payload=False, with_vectors=False)
+        existing.update(str(point.id) for point in points)
+
+    new_ids = [point_id for point_id in ids if point_id not in existing]
+    if new_ids:
+        vectors = embed_in_batches(embeddings, [chunks[point_id][1].page_content for point_id in new_ids])
+        points = []
+        for point_id, vector in zip(new_ids, vectors):
+            content_hash, doc = chunks[point_id]
+            metadata = {**doc.metadata, "source_id": source_id, "content_hash": content_hash}
+            points.append(PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={"page_content": doc.page_content, "metadata": metadata},
+            ))
+        for i in range(0, len(points), 256):
+            client.upsert(collection_name=collection_name, points=points[i:i + 256])
+
+    keep = set(ids)
+    stale = []
+    source_filter = Filter(must=[FieldCondition(key="metadata.source_id", match=MatchValue(value=source_id))])
+    offset = None
+    while True:
+        points, offset = client.scroll(collection_name, scroll_filter=source_filter, limit=256, offset=offset,
+                                       with_payload=False, with_vectors=False)
+        stale.extend(point.id for point in points if str(point.id) not in keep)
+        if offset is None:
+            break
+    for i in range(0, len(stale), 256):
+        client.delete(collection_name, points_selector=stale[i:i + 256])
+
+    return len(new_ids), len(existing), len(stale)
+
+
 st.subheader("Document Input")
 input_option = st.radio("Choose input method:", ["URL", "File Upload"])
 
 docs = None  
+source_id = None
 
 if input_option == "URL":
     url = st.text_input("Enter document URL:", value=st.session_state.doc_url)
     if url:
-        docs = load_documents(url, is_url=True)
+        source_id = url
+        if source_id not in st.session_state.indexed_sources:
+            docs = load_documents(url, is_url=True)
 else:
     uploaded_file = st.file_uploader("Upload a document", type=['pdf', 'txt', 'md'])
     if uploaded_file:
-        # Create a temporary file to store the upload
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            docs = load_documents(tmp_file.name, is_url=False)
-        # Clean up the temporary file
-        os.unlink(tmp_file.name)
+        file_bytes = uploaded_file.getvalue()
+        source_id = f"{uploaded_file.name}:{hashlib.sha256(file_bytes).hexdigest()[:16]}"
+        if source_id not in st.session_state.indexed_sources:
+            # Create a temporary file to store the upload
+            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
+                tmp_file.write(file_bytes)
+                docs = load_documents(tmp_file.name, is_url=False)
+            # Clean up the temporary file
+            os.unlink(tmp_file.name)
 
 if docs:
     text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
@@ -196,72 +318,57 @@ if docs:
     )
     all_splits = text_splitter.split_documents(docs)
 
-    client = QdrantClient(url=st.session_state.qdrant_url, api_key=st.session_state.qdrant_api_key)
-    collection_name = "rag-qdrant"
-
-    try:
-        # Try to delete the collection if it exists
-        client.delete_collection(collection_name)
-    except Exception:
-        pass  
-
-    client.create_collection(
-        collection_name=collection_name,
-        vectors_config=VectorParams(size=1536, distance=Distance.COSINE),
-    )
+    ensure_collection(resources.client)
+    added, skipped, deleted = index_documents(resources.client, resources.embeddings, all_splits, source_id)
+    st.session_state.indexed_sources[source_id] = added + skipped
+    st.caption(f"Indexed {added} new chunks, reused {skipped} already embedded chunks, "
+               f"deleted {deleted} stale chunks (embedding cache hit rate {resources.embeddings.hit_rate:.0%})")
 
-    # Create vectorstore
+if source_id in st.session_state.indexed_sources:
     vectorstore = Qdrant(
-        client=client,
-        collection_name=collection_name,
-        embeddings=embeddings,
+        client=resources.client,
+        collection_name=COLLECTION_NAME,
+        embeddings=resources.embeddings,
     )
-
-    # Add documents to the vectorstore
-    vectorstore.add_documents(all_splits)
-    retriever = vectorstore.as_retriever()
+    # Only retrieve from the document currently selected
+    retriever = vectorstore.as_retriever(search_kwargs={
+        "filter": Filter(must=[FieldCondition(key="metadata.source_id", match=MatchValue(value=source_id))])
+    })
 
 
 class GraphState(TypedDict):
     keys: Dict[str, any]
 
 
-def retrieve(state):
+def retrieve(state, config):
     print("~-retrieve-~")
     state_dict = state["keys"]
     question = state_dict["question"]
+    retriever = config["configurable"].get("retriever")
     
     if retriever is None:
         return {"keys": {"documents": [], "question": question}}
-        
+
+    embeddings = resources_from_config(config).embeddings
+    hits_before = embeddings.hits
     documents = retriever.get_relevant_documents(question)
+    tracer = config["configurable"].get("tracer")
+    if tracer is not None:
+        tracer.record_cache_hit(embeddings.hits - hits_before)
     return {"keys": {"documents": documents, "question": question}}
 
 
-def generate(state):
+def generate(state, config):
     """Generate answer using Claude 3 model"""
     print("~-generate-~")
     state_dict = state["keys"]
     question, documents = state_dict["question"], state_dict["documents"]
     try:
-        prompt = PromptTemplate(template="""Based on the following context, please answer the question.
-            Context: {context}
-            Question: {question}
-            Answer:""", input_variables=["context", "question"])
-        llm = ChatAnthropic(model="claude-3-5-sonnet-20241022", api_key=st.session_state.anthropic_api_key,
-                           temperature=0, max_tokens=1000)
         context = "\n\n".join(doc.page_content for doc in documents)
-
-        # Create and run chain
-        rag_chain = (
-            {"context": lambda x: context, "question": lambda x: question} 
-            | prompt 
-            | llm 
-            | StrOutputParser()
+        generation = resources_from_config(config).generate_chain.invoke(
+            {"context": context, "question": question}
         )
 
-        generation = rag_chain.invoke({})
-
         return {
             "keys": {
                 "documents": documents,
@@ -277,94 +384,108 @@ def generate(state):
         return {"keys": {"documents": documents, "question": question, 
                 "generation": "Sorry, I encountered an error while generating the response."}}
 
-def grade_documents(state):
+def parse_grade(response: str) -> dict:
+    """Extract the JSON score object from a single-document grading response."""
+    json_match = re.search(r'\{.*\}', response, re.DOTALL)
+    if json_match:
+        response = json_match.group()
+    return json.loads(response)
+
+
+def grade_sequential(resources: Resources, question: str, documents: list) -> list:
+    """Grade documents one call at a time. Returns a list of True/False/None (None = error)."""
+    grades = []
+    for d in documents:
+        try:
+            response = resources.grade_chain.invoke({"question": question, "context": d.page_content})
+            grades.append(parse_grade(response).get("score") == "yes")
+        except Exception as e:
+            print(f"Error grading document: {str(e)}")
+            grades.append(None)
+    return grades
+
+
+def grade_concurrent(resources: Resources, question: str, documents: list, max_concurrency: int) -> list:
+    """Grade documents with one call each, run through a bounded abatch."""
+    inputs = [{"question": question, "context": d.page_content} for d in documents]
+
+    responses = asyncio.run(
+        resources.grade_chain.abatch(inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True)
+    )
+
+    grades = []
+    for response in responses:
+        try:
+            if isinstance(response, Exception):
+                raise response
+            grades.append(parse_grade(response).get("score") == "yes")
+        except Exception as e:
+            print(f"Error grading document: {str(e)}")
+            grades.append(None)
+    return grades
+
+
+def grade_batched(resources: Resources, question: str, documents: list) -> list:
+    """Grade all documents in a single structured call."""
+    numbered = "\n\n".join(f"[{i}] {d.page_content}" for i, d in enumerate(documents))
+
+    try:
+        result = resources.batch_grade_chain.invoke({"question": question, "documents": numbered})
+    except Exception as e:
+        print(f"Error grading documents in batch: {str(e)}")
+        return [None] * len(documents)
+
+    # Documents the model skipped stay ungraded and are kept, like any other grading error
+    grades = [None] * len(documents)
+    for grade in result.grades:
+        if 0 <= grade.index < len(documents):
+            grades[grade.index] = grade.score.strip().lower() == "yes"
+    return grades
+
+
+def grade_documents(state, config):
     """Determines whether the retrieved documents are relevant."""
     print("~-check relevance-~")
     state_dict = state["keys"]
     question = state_dict["question"]
     documents = state_dict["documents"]
 
-    llm = ChatAnthropic(model="claude-3-5-sonnet-20241022", api_key=st.session_state.anthropic_api_key,
-                       temperature=0, max_tokens=1000)
-
-    prompt = PromptTemplate(template="""You are grading the relevance of a retrieved document to a user question.
-        Return ONLY a JSON object with a "score" field that is either "yes" or "no".
-        Do not include any other text or explanation.
-        
-        Document: {context}
-        Question: {question}
-        
-        Rules:
-        - Check for related keywords or semantic meaning
-        - Use lenient grading to only filter clear mismatches
-        - Return exactly like this example: {{"score": "yes"}} or {{"score": "no"}}""",
-        input_variables=["context", "question"])
-
-    chain = (
-        prompt 
-        | llm 
-        | StrOutputParser()
-    )
-
     filtered_docs = []
     search = "No"
-    
-    for d in documents:
-        try:
-            response = chain.invoke({"question": question, "context": d.page_content})
-            import re
-            json_match = re.search(r'\{.*\}', response)
-            if json_match:
-                response = json_match.group()
-            
-            import json
-            score = json.loads(response)
-            
-            if score.get("score") == "yes":
-                print("~-grade: document relevant-~")
-                filtered_docs.append(d)
-            else:
-                print("~-grade: document not relevant-~")
-                search = "Yes"
-                
-        except Exception as e:
-            print(f"Error grading document: {str(e)}")
+    if not documents:
+        return {"keys": {"documents": filtered_docs, "question": question, "run_web_search": search}}
+
+    resources = resources_from_config(config)
+    mode = st.session_state.get("grading_mode", "Sequential")
+    if mode == "Batched":
+        grades = grade_batched(resources, question, documents)
+    elif mode == "Concurrent":
+        grades = grade_concurrent(resources, question, documents, st.session_state.get("grading_concurrency", 4))
+    else:
+        grades = grade_sequential(resources, question, documents)
+
+    for d, relevant in zip(documents, grades):
+        if relevant is None:
             # On error, keep the document to be safe
             filtered_docs.append(d)
-            continue
+        elif relevant:
+            print("~-grade: document relevant-~")
+            filtered_docs.append(d)
+        else:
+            print("~-grade: document not relevant-~")
+            search = "Yes"
 
     return {"keys": {"documents": filtered_docs, "question": question, "run_web_search": search}}
 
 
-def transform_query(state):
+def transform_query(state, config):
     """Transform the query to produce a better question."""
     print("~-transform query-~")
     state_dict = state["keys"]
     question = state_dict["question"]
     documents = state_dict["documents"]
 
-    # Create a prompt template
-    prompt = PromptTemplate(
-        template="""Generate a search-optimized version of this question by 
-        analyzing its core semantic meaning and intent.
-        \n ------- \n
-        {question}
-        \n ------- \n
-        Return only the improved question with no additional text:""",
-        input_variables=["question"],
-    )
-
-    # Use Claude instead of Gemini
-    llm = ChatAnthropic(
-        model="claude-3-5-sonnet-20240620",
-        anthropic_api_key=st.session_state.anthropic_api_key,
-        temperature=0,
-        max_tokens=1000
-    )
-
-    # Prompt
-    chain = prompt | llm | StrOutputParser()
-    better_question = chain.invoke({"question": question})
+    better_question = resources_from_config(config).transform_chain.invoke({"question": question})
 
     return {
         "keys": {"documents": documents, "question": better_question}
@@ -403,31 +524,41 @@ def format_state(state: dict) -> str:
     return formatted
 
 
-workflow = StateGraph(GraphState)
-
-# Define the nodes by langgraph
-workflow.add_node("retrieve", retrieve) 
-workflow.add_node("grade_documents", grade_documents)  
-workflow.add_node("generate", generate) 
-workflow.add_node("transform_query", transform_query)  
-workflow.add_node("web_search", web_search) 
-
-# Build graph
-workflow.set_entry_point("retrieve")
-workflow.add_edge("retrieve", "grade_documents")
-workflow.add_conditional_edges(
-    "grade_documents",
-    decide_to_generate,
-    {
-        "transform_query": "transform_query",
-        "generate": "generate",
-    },
-)
-workflow.add_edge("transform_query", "web_search")
-workflow.add_edge("web_search", "generate")
-workflow.add_edge("generate", END)
+@st.cache_resource(show_spinner=False)
+def build_graph():
+    """Compile the corrective RAG workflow once per process.
 
-app = workflow.compile()
+    Clients and the retriever are not captured here; they are passed in per run
+    through config["configurable"].
+    """
+    workflow = StateGraph(GraphState)
+
+    # Define the nodes by langgraph
+    workflow.add_node("retrieve", traced("retrieve", retrieve)) 
+    workflow.add_node("grade_documents", traced("grade_documents", grade_documents))  
+    workflow.add_node("generate", traced("generate", generate)) 
+    workflow.add_node("transform_query", traced("transform_query", transform_query))  
+    workflow.add_node("web_search", traced("web_search", web_search)) 
+
+    # Build graph
+    workflow.set_entry_point("retrieve")
+    workflow.add_edge("retrieve", "grade_documents")
+    workflow.add_conditional_edges(
+        "grade_documents",
+        decide_to_generate,
+        {
+            "transform_query": "transform_query",
+            "generate": "generate",
+        },
+    )
+    workflow.add_edge("transform_query", "web_search")
+    workflow.add_edge("web_search", "generate")
+    workflow.add_edge("generate", END)
+
+    return workflow.compile()
+
+
+app = build_graph()
 
 st.title("🔄 Corrective RAG Agent")
 
@@ -443,11 +574,38 @@ if user_question:
         }
     }
 
-    for output in app.stream(inputs):
+    tracer = GraphTracer(user_question)
+    run_config = {
+        "configurable": {"resources": resources, "retriever": retriever, "tracer": tracer},
+        "callbacks": [tracer.callback],
+    }
+    for output in app.stream(inputs, config=run_config):
         for key, value in output.items():
             with st.expander(f"Step '{key}':"):
                 st.text(pprint.pformat(format_state(value["keys"]), indent=2, width=80))
+    trace = tracer.finish()
 
     final_generation = value['keys'].get('generation', 'No final generation produced.')
     st.subheader("Final Generation:")
     st.write(final_generation)
+
+    rows = waterfall_rows(trace)
+    with st.expander(f"Trace ({st.session_state.grading_mode} grading, {trace.total_ms / 1000:.2f}s total, "
+                     f"path: {' → '.join(trace.path)})"):
+        waterfall = alt.Chart(alt.Data(values=rows)).mark_bar().encode(
+            x=alt.X("start_ms:Q", title="ms since question"),
+            x2="end_ms:Q",
+            y=alt.Y("node:N", sort=None, title=None),
+            tooltip=["node:N", "duration_ms:Q", "docs_in:Q", "docs_out:Q",
+                     "input_tokens:Q", "output_tokens:Q", "cache_hits:Q"],
+        )
+        st.altair_chart(waterfall, use_container_width=True)
+        st.table(rows)
+
+        trace_json = tracer.to_json()
+        st.download_button("Download trace JSON", trace_json, file_name=f"crag_trace_{trace.trace_id}.json",
+                           mime="application/json")
+
+    if st.session_state.save_traces:
+        with open(TRACE_LOG_PATH, "a") as f:
+            f.write(json.dumps(tracer.to_dict()) + "\n")
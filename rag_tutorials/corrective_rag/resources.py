@@ -0,0 +1,134 @@
+"""Model clients, chains and vector-store handles shared by the corrective RAG graph nodes.
+
+Everything here is built once per configuration (see `get_resources` in
+corrective_rag.py) and handed to the graph through its config, so the nodes
+never construct clients themselves.
+"""
+import os
+import sys
+from dataclasses import dataclass
+from typing import List
+
+from langchain.output_parsers import PydanticOutputParser
+from langchain_anthropic import ChatAnthropic
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_openai import OpenAIEmbeddings
+from pydantic import BaseModel, Field
+from qdrant_client import QdrantClient
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_utils.embedding_cache import CachedEmbeddings
+
+
+GENERATE_PROMPT = """Based on the following context, please answer the question.
+            Context: {context}
+            Question: {question}
+            Answer:"""
+
+GRADE_PROMPT = """You are grading the relevance of a retrieved document to a user question.
+        Return ONLY a JSON object with a "score" field that is either "yes" or "no".
+        Do not include any other text or explanation.
+
+        Document: {context}
+        Question: {question}
+
+        Rules:
+        - Check for related keywords or semantic meaning
+        - Use lenient grading to only filter clear mismatches
+        - Return exactly like this example: {{"score": "yes"}} or {{"score": "no"}}"""
+
+BATCH_GRADE_PROMPT = """You are grading the relevance of several retrieved documents to a user question.
+        Each document is prefixed with its index in square brackets.
+
+        Documents:
+        {documents}
+
+        Question: {question}
+
+        Rules:
+        - Check for related keywords or semantic meaning
+        - Use lenient grading to only filter clear mismatches
+        - Grade every document exactly once, using its index
+
+        {format_instructions}"""
+
+TRANSFORM_PROMPT = """Generate a search-optimized version of this question by
+        analyzing its core semantic meaning and intent.
+        \n ------- \n
+        {question}
+        \n ------- \n
+        Return only the improved question with no additional text:"""
+
+
+class DocumentGrade(BaseModel):
+    index: int = Field(description="Index of the document being graded")
+    score: str = Field(description="'yes' if the document is relevant, otherwise 'no'")
+
+
+class BatchGrades(BaseModel):
+    grades: List[DocumentGrade] = Field(description="One grade per document")
+
+
+@dataclass(frozen=True)
+class ResourceConfig:
+    anthropic_api_key: str
+    openai_api_key: str
+    qdrant_url: str
+    qdrant_api_key: str = ""
+
+
+class Resources:
+    """LLM clients, compiled chains and vector-store handles for one configuration."""
+
+    def __init__(self, config: ResourceConfig):
+        self.config = config
+
+        self.embeddings = CachedEmbeddings(OpenAIEmbeddings(
+            model="text-embedding-3-small",
+            api_key=config.openai_api_key
+        ))
+        self.client = QdrantClient(
+            url=config.qdrant_url,
+            api_key=config.qdrant_api_key or None
+        )
+
+        self.llm = ChatAnthropic(model="claude-3-5-sonnet-20241022", api_key=config.anthropic_api_key,
+                                 temperature=0, max_tokens=1000)
+        self.transform_llm = ChatAnthropic(model="claude-3-5-sonnet-20240620", api_key=config.anthropic_api_key,
+                                           temperature=0, max_tokens=1000)
+
+        self.generate_chain = (
+            PromptTemplate(template=GENERATE_PROMPT, input_variables=["context", "question"])
+            | self.llm
+            | StrOutputParser()
+        )
+        self.grade_chain = (
+            PromptTemplate(template=GRADE_PROMPT, input_variables=["context", "question"])
+            | self.llm
+            | StrOutputParser()
+        )
+        batch_parser = PydanticOutputParser(pydantic_object=BatchGrades)
+        self.batch_grade_chain = (
+            PromptTemplate(
+                template=BATCH_GRADE_PROMPT,
+                input_variables=["documents", "question"],
+                partial_variables={"format_instructions": batch_parser.get_format_instructions()},
+            )
+            | self.llm
+            | batch_parser
+        )
+        self.transform_chain = (
+            PromptTemplate(template=TRANSFORM_PROMPT, input_variables=["question"])
+            | self.transform_llm
+            | StrOutputParser()
+        )
+
+
+def build_resources(config: ResourceConfig) -> Resources:
+    return Resources(config)
+
+
+def resources_from_config(config: dict) -> Resources:
+    """Fetch the Resources passed to the graph via config={"configurable": {"resources": ...}}."""
+    return config["configurable"]["resources"]
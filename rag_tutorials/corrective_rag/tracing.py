@@ -0,0 +1,143 @@
+"""Per-node tracing for the corrective RAG StateGraph.
+
+Each node is wrapped with `traced`, which records wall time, documents in and
+out, LLM token usage and cache hits into the `GraphTracer` passed through
+config["configurable"]["tracer"]. Traces can be rendered as a waterfall and
+exported as JSON for offline profiling.
+"""
+import json
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from functools import wraps
+from typing import List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+@dataclass
+class NodeSpan:
+    node: str
+    start_ms: float
+    duration_ms: float = 0.0
+    docs_in: int = 0
+    docs_out: int = 0
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_hits: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class GraphTrace:
+    question: str
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    total_ms: float = 0.0
+    spans: List[NodeSpan] = field(default_factory=list)
+
+    @property
+    def path(self) -> List[str]:
+        return [span.node for span in self.spans]
+
+
+class _TokenUsageHandler(BaseCallbackHandler):
+    """Adds token usage of every LLM call to the span of the node that is running."""
+
+    def __init__(self, tracer: "GraphTracer"):
+        self.tracer = tracer
+
+    def on_llm_end(self, response, **kwargs):
+        span = self.tracer.active_span
+        if span is None:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                span.llm_calls += 1
+                span.input_tokens += usage.get("input_tokens", 0)
+                span.output_tokens += usage.get("output_tokens", 0)
+
+
+class GraphTracer:
+    """Collects one GraphTrace per graph run."""
+
+    def __init__(self, question: str):
+        self.trace = GraphTrace(question=question)
+        self.active_span: Optional[NodeSpan] = None
+        self.callback = _TokenUsageHandler(self)
+        self._origin = time.perf_counter()
+
+    def start(self, node: str, docs_in: int) -> NodeSpan:
+        span = NodeSpan(node=node, start_ms=(time.perf_counter() - self._origin) * 1000, docs_in=docs_in)
+        self.trace.spans.append(span)
+        self.active_span = span
+        return span
+
+    def end(self, span: NodeSpan, docs_out: int, error: Optional[str] = None):
+        span.duration_ms = (time.perf_counter() - self._origin) * 1000 - span.start_ms
+        span.docs_out = docs_out
+        span.error = error
+        self.active_span = None
+
+    def record_cache_hit(self, count: int = 1):
+        if self.active_span is not None:
+            self.active_span.cache_hits += count
+
+    def finish(self) -> GraphTrace:
+        self.trace.total_ms = (time.perf_counter() - self._origin) * 1000
+        return self.trace
+
+    def to_dict(self) -> dict:
+        data = asdict(self.trace)
+        data["path"] = self.trace.path
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+
+def _count_documents(state: dict) -> int:
+    return len(state.get("keys", {}).get("documents") or [])
+
+
+def traced(name: str, node_fn):
+    """Wrap a graph node so it reports into the tracer found in its config, if any."""
+
+    @wraps(node_fn)
+    def wrapper(state, config):
+        tracer = config.get("configurable", {}).get("tracer")
+        if tracer is None:
+            return node_fn(state, config)
+
+        span = tracer.start(name, _count_documents(state))
+        try:
+            result = node_fn(state, config)
+        except Exception as e:
+            tracer.end(span, 0, error=str(e))
+            raise
+        tracer.end(span, _count_documents(result))
+        return result
+
+    return wrapper
+
+
+def waterfall_rows(trace: GraphTrace) -> List[dict]:
+    """Flatten spans into rows suitable for a table or Gantt-style chart."""
+    return [
+        {
+            "node": span.node,
+            "start_ms": round(span.start_ms, 1),
+            "end_ms": round(span.start_ms + span.duration_ms, 1),
+            "duration_ms": round(span.duration_ms, 1),
+            "docs_in": span.docs_in,
+            "docs_out": span.docs_out,
+            "llm_calls": span.llm_calls,
+            "input_tokens": span.input_tokens,
+            "output_tokens": span.output_tokens,
+            "cache_hits": span.cache_hits,
+        }
+        for span in trace.spans
+    ]
@@ -1,4 +1,5 @@
 import os
+import sys
 import tempfile
 from datetime import datetime
 from typing import List
@@ -13,22 +14,26 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams
-from langchain_core.embeddings import Embeddings
 from agno.tools.exa import ExaTools
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_utils.batched_embeddings import BatchedEmbeddings
+
+
+class GeminiEmbedder(BatchedEmbeddings):
+    # batchEmbedContents accepts at most 100 texts per request; the character budget keeps payloads small
+    max_batch_size = 100
+    max_batch_chars = 200_000
+    max_concurrency = 4
 
-class GeminiEmbedder(Embeddings):
     def __init__(self, model_name="models/text-embedding-004"):
         genai.configure(api_key=st.session_state.google_api_key)
         self.model = model_name
 
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        return [self.embed_query(text) for text in texts]
-
-    def embed_query(self, text: str) -> List[float]:
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
         response = genai.embed_content(
             model=self.model,
-            content=text,
+            content=texts,
             task_type="retrieval_document"
         )
         return response['embedding']
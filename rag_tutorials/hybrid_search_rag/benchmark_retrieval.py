@@ -0,0 +1,207 @@
+"""Offline retrieval benchmark for the RAGLite hybrid search apps.
+
+Builds one local SQLite RAGLite database per chunking configuration, then runs
+a labelled query set against hybrid, vector-only and BM25 keyword search and
+reports recall@k, MRR, p50/p95 retrieval latency and rerank latency.
+
+Query set: a JSONL file with one object per line:
+
+    {"query": "What is late chunking?",
+     "relevant_documents": ["raglite_paper.pdf"],
+     "answer_contains": ["late chunking"]}
+
+`relevant_documents` lists file names of documents that answer the query.
+`answer_contains` is optional. When given, each string is a target, found if a
+retrieved chunk from a relevant document contains it (case-insensitive).
+Otherwise each relevant document is a target. recall@k is measured on the top
+`max_contexts` chunks after reranking (and, for comparison, before it).
+
+With a llama-cpp embedder RAGLite always uses a sentence window of 1, so
+--window-size has no effect there.
+
+Usage (API models, as in main.py):
+    python benchmark_retrieval.py --docs ./pdfs --queries queries.jsonl \\
+        --chunk-max-size 1000 2000 --window-size 2 3 --num-results 5 10 --max-contexts 3 5
+
+Usage (local models, as in local_main.py):
+    python benchmark_retrieval.py --docs ./pdfs --queries queries.jsonl \\
+        --embedder "llama-cpp-python/lm-kit/bge-m3-gguf/bge-m3-Q4_K_M.gguf@1024" --reranker flashrank
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from raglite import RAGLiteConfig, hybrid_search, keyword_search, rerank_chunks, retrieve_chunks, vector_search
+from raglite._database import Document, create_database_engine
+from rerankers import Reranker
+from sqlmodel import Session, select
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_utils.raglite_ingest import ingest_documents
+
+SEARCH_METHODS = {"hybrid": hybrid_search, "vector": vector_search, "bm25": keyword_search}
+
+
+def build_reranker(name: str):
+    if name == "cohere":
+        return Reranker("cohere", api_key=os.environ["COHERE_API_KEY"], lang="en")
+    if name == "flashrank":
+        return Reranker("ms-marco-MiniLM-L-12-v2", model_type="flashrank")
+    return None
+
+
+def load_queries(path: str) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def relevance(chunks, labels: dict, filenames: Dict[str, str]) -> List[bool]:
+    """For each retrieved chunk, whether it is relevant to the labelled query."""
+    relevant_docs = set(labels.get("relevant_documents", []))
+    answers = [answer.lower() for answer in labels.get("answer_contains", [])]
+    relevant = []
+    for chunk in chunks:
+        in_doc = filenames.get(chunk.document_id) in relevant_docs
+        relevant.append(in_doc and (not answers or any(a in chunk.body.lower() for a in answers)))
+    return relevant
+
+
+def recall_at_k(chunks, labels: dict, filenames: Dict[str, str], k: int) -> float:
+    top = chunks[:k]
+    relevant_docs = set(labels.get("relevant_documents", []))
+    answers = [answer.lower() for answer in labels.get("answer_contains", [])]
+    top_in_docs = [chunk for chunk in top if filenames.get(chunk.document_id) in relevant_docs]
+    if answers:
+        found = sum(any(a in chunk.body.lower() for chunk in top_in_docs) for a in answers)
+        return found / len(answers)
+    if not relevant_docs:
+        return 0.0
+    return len({filenames[chunk.document_id] for chunk in top_in_docs}) / len(relevant_docs)
+
+
+def reciprocal_rank(chunks, labels: dict, filenames: Dict[str, str]) -> float:
+    for rank, relevant in enumerate(relevance(chunks, labels, filenames), start=1):
+        if relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def document_filenames(config: RAGLiteConfig) -> Dict[str, str]:
+    with Session(create_database_engine(config)) as session:
+        return {doc.id: doc.filename for doc in session.exec(select(Document)).all()}
+
+
+def run_configuration(config: RAGLiteConfig, queries: List[dict], num_results: int, max_contexts: int) -> List[dict]:
+    filenames = document_filenames(config)
+    rows = []
+    for method, search in SEARCH_METHODS.items():
+        retrieval_ms, rerank_ms, recall_raw, recall_reranked, rr = [], [], [], [], []
+        for labels in queries:
+            start = time.perf_counter()
+            chunk_ids, _ = search(labels["query"], num_results=num_results, config=config)
+            chunks = retrieve_chunks(chunk_ids, config=config) if chunk_ids else []
+            retrieval_ms.append((time.perf_counter() - start) * 1000)
+
+            reranked = chunks
+            if chunks and config.reranker:
+                start = time.perf_counter()
+                reranked = rerank_chunks(labels["query"], chunks, config=config)
+                rerank_ms.append((time.perf_counter() - start) * 1000)
+
+            recall_raw.append(recall_at_k(chunks, labels, filenames, max_contexts))
+            recall_reranked.append(recall_at_k(reranked, labels, filenames, max_contexts))
+            rr.append(reciprocal_rank(reranked, labels, filenames))
+
+        rows.append({
+            "chunk_max_size": config.chunk_max_size,
+            "window_size": config.embedder_sentence_window_size,
+            "num_results": num_results,
+            "max_contexts": max_contexts,
+            "method": method,
+            "recall@k": round(statistics.mean(recall_reranked), 3),
+            "recall@k_no_rerank": round(statistics.mean(recall_raw), 3),
+            "mrr": round(statistics.mean(rr), 3),
+            "retrieval_p50_ms": round(percentile(retrieval_ms, 0.5), 1),
+            "retrieval_p95_ms": round(percentile(retrieval_ms, 0.95), 1),
+            "rerank_p50_ms": round(percentile(rerank_ms, 0.5), 1),
+            "rerank_p95_ms": round(percentile(rerank_ms, 0.95), 1),
+        })
+    return rows
+
+
+def print_table(rows: List[dict]):
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(row[c])) for row in rows)) for c in columns}
+    print(" | ".join(c.ljust(widths[c]) for c in columns))
+    print("-+-".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print(" | ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RAGLite retrieval settings")
+    parser.add_argument("--docs", required=True, help="Directory of PDFs to index")
+    parser.add_argument("--queries", required=True, help="Labelled query set (JSONL)")
+    parser.add_argument("--db-dir", default="./benchmark_dbs", help="Where the per-configuration SQLite DBs go")
+    parser.add_argument("--embedder", default="text-embedding-3-large")
+    parser.add_argument("--reranker", choices=["cohere", "flashrank", "none"], default="cohere")
+    parser.add_argument("--chunk-max-size", type=int, nargs="+", default=[2000])
+    parser.add_argument("--window-size", type=int, nargs="+", default=[2])
+    parser.add_argument("--num-results", type=int, nargs="+", default=[10])
+    parser.add_argument("--max-contexts", type=int, nargs="+", default=[5])
+    parser.add_argument("--out", help="Optional CSV file for the comparison table")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    doc_paths = sorted(str(p) for p in Path(args.docs).glob("*.pdf"))
+    os.makedirs(args.db_dir, exist_ok=True)
+    reranker = build_reranker(args.reranker)
+
+    rows = []
+    for chunk_max_size, window_size in itertools.product(args.chunk_max_size, args.window_size):
+        db_path = os.path.join(args.db_dir, f"raglite_c{chunk_max_size}_w{window_size}.sqlite")
+        config = RAGLiteConfig(
+            db_url=f"sqlite:///{db_path}",
+            embedder=args.embedder,
+            embedder_normalize=True,
+            chunk_max_size=chunk_max_size,
+            embedder_sentence_window_size=window_size,
+            reranker=reranker,
+        )
+        # Re-running the benchmark reuses the databases; only missing documents are ingested.
+        report = ingest_documents(doc_paths, config=config)
+        print(f"[{db_path}] inserted {len(report.inserted)}, reused {len(report.skipped)}, "
+              f"failed {len(report.failed)}", file=sys.stderr)
+
+        for num_results, max_contexts in itertools.product(args.num_results, args.max_contexts):
+            if max_contexts > num_results:
+                continue
+            rows.extend(run_configuration(config, queries, num_results, max_contexts))
+
+    if not rows:
+        print("No configurations to report.", file=sys.stderr)
+        return
+    print_table(rows)
+    if args.out:
+        with open(args.out, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,10 @@
 import os
+import sys
 import logging
 import streamlit as st
-from raglite import RAGLiteConfig, insert_document, hybrid_search, retrieve_chunks, rerank_chunks, rag
+from raglite import RAGLiteConfig, hybrid_search, retrieve_chunks, rag
 from rerankers import Reranker
 from typing import List
-from pathlib import Path
 import anthropic
 import time
 import warnings
@@ -13,6 +13,14 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 warnings.filterwarnings("ignore", message=".*torch.classes.*")
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_utils.raglite_ingest import STAGES, DocumentSource, IngestReport, ingest_documents
+from rag_utils.search_cache import SearchResultCache, index_version
+from rag_utils.adaptive_rerank import AdaptiveReranker, RerankPolicy
+
+# Chunks passed to the LLM as context
+MAX_CONTEXTS = 5
+
 RAG_SYSTEM_PROMPT = """
 You are a friendly and knowledgeable assistant that provides complete and insightful answers.
 Answer the user's question using only the context below.
@@ -55,32 +63,28 @@ def initialize_config(openai_key: str, anthropic_key: str, cohere_key: str, db_u
     except Exception as e:
         raise ValueError(f"Configuration error: {e}")
 
-def process_document(file_path: str) -> bool:
-    """Processes a document by inserting it into a system with a given configuration.
+def process_documents(sources: List[DocumentSource], on_progress=None) -> IngestReport:
+    """Ingests a batch of documents into the RAGLite database.
 
-    This function checks if a configuration is initialized in the session state.
-    If the configuration is present, it attempts to insert the document located
-    at the given file path using this configuration.
+    Documents are parsed in parallel worker processes, embedded in shared batches
+    and written by a single writer. Documents already in the database are skipped.
 
     Args:
-        file_path (str): The path to the document to be processed.
+        sources (List[DocumentSource]): In-memory documents (name and bytes) to be processed.
+        on_progress (Callable, optional): Called as on_progress(stage, done, total).
 
     Returns:
-        bool: True if the document was successfully processed; False otherwise."""
-    try:
-        if not st.session_state.get('my_config'):
-            raise ValueError("Configuration not initialized")
-        insert_document(Path(file_path), config=st.session_state.my_config)
-        return True
-    except Exception as e:
-        logger.error(f"Error processing document: {str(e)}")
-        return False
+        IngestReport: Inserted, skipped and failed documents with per-stage timings."""
+    if not st.session_state.get('my_config'):
+        raise ValueError("Configuration not initialized")
+    return ingest_documents(sources, config=st.session_state.my_config, on_progress=on_progress)
 
 def perform_search(query: str) -> List[dict]:
     """Conducts a hybrid search and returns a list of ranked chunks based on the query.
 
     This function performs a search using a hybrid search method, retrieves the relevant 
-    chunks, and reranks them according to the query. It handles any exceptions that occur 
+    chunks, and reranks them according to the query. Only the uncertain head of the
+    results is reranked: a clear winner in the fused scores skips the reranker. It handles any exceptions that occur 
     during the process and logs the errors.
 
     Args:
@@ -89,12 +93,23 @@ def perform_search(query: str) -> List[dict]:
     Returns:
         List[dict]: A list of dictionaries representing the ranked chunks. Returns an 
         empty list if no results are found or if an error occurs."""
-    try:
-        chunk_ids, scores = hybrid_search(query, num_results=10, config=st.session_state.my_config)
+    config = st.session_state.my_config
+    # As many candidates as rag() retrieves for reranking when given a search method
+    num_results = 4 * MAX_CONTEXTS
+
+    def search_and_rerank() -> List[dict]:
+        chunk_ids, scores = hybrid_search(query, num_results=num_results, config=config)
         if not chunk_ids:
             return []
-        chunks = retrieve_chunks(chunk_ids, config=st.session_state.my_config)
-        return rerank_chunks(query, chunks, config=st.session_state.my_config)
+        chunks = retrieve_chunks(chunk_ids, config=config)
+        reranked, _ = st.session_state.reranker.rerank(query, chunks, scores, config=config)
+        return reranked
+
+    try:
+        # Repeated queries are served from the cache without searching or reranking again
+        cache = st.session_state.search_cache
+        key = cache.key(query, config, num_results=num_results)
+        return cache.get_or_compute(key, index_version(config), search_and_rerank)
     except Exception as e:
         logger.error(f"Search error: {str(e)}")
         return []
@@ -125,6 +140,13 @@ def main():
     for state_var in ['chat_history', 'documents_loaded', 'my_config', 'user_env']:
         if state_var not in st.session_state:
             st.session_state[state_var] = [] if state_var == 'chat_history' else False if state_var == 'documents_loaded' else None if state_var == 'my_config' else {}
+    if 'ingested_files' not in st.session_state:
+        st.session_state.ingested_files = set()
+    if 'search_cache' not in st.session_state:
+        st.session_state.search_cache = SearchResultCache(maxsize=128)
+    if 'reranker' not in st.session_state:
+        # Cohere reranks all candidates in one API call; a tenth of the adaptive decisions are checked in full
+        st.session_state.reranker = AdaptiveReranker(RerankPolicy(shadow_rate=0.1))
 
     with st.sidebar:
         st.title("Configuration")
@@ -148,29 +170,53 @@ def main():
             except Exception as e:
                 st.error(f"Configuration error: {str(e)}")
 
+    with st.sidebar:
+        cache_stats = st.session_state.search_cache.stats()
+        st.caption(f"Search cache: {cache_stats['entries']} entries, {cache_stats['hits']} hits, "
+                   f"{cache_stats['misses']} misses, {cache_stats['invalidations']} invalidations")
+        rerank_stats = st.session_state.reranker.stats()
+        st.caption(f"Adaptive rerank: {rerank_stats['skip']} skipped, {rerank_stats['head']} head-only, "
+                   f"{rerank_stats['full']} full, ~{rerank_stats['total_saved_ms']:.0f} ms of reranking saved (est.)")
+
     st.title("👀 RAG App with Hybrid Search")
 
     if st.session_state.my_config:
         uploaded_files = st.file_uploader("Upload PDF documents", type=["pdf"], accept_multiple_files=True, key="pdf_uploader")
 
-        if uploaded_files:
-            success = False
-            for uploaded_file in uploaded_files:
-                with st.spinner(f"Processing {uploaded_file.name}..."):
-                    temp_path = f"temp_{uploaded_file.name}"
-                    with open(temp_path, "wb") as f:
-                        f.write(uploaded_file.getvalue())
-                    
-                    if process_document(temp_path):
-                        st.success(f"Successfully processed: {uploaded_file.name}")
-                        success = True
-                    else:
-                        st.error(f"Failed to process: {uploaded_file.name}")
-                    os.remove(temp_path)
-            
-            if success:
-                st.session_state.documents_loaded = True
-                st.success("Documents are ready! You can now ask questions about them.")
+        # Uploads persist across reruns, so only ingest files not seen in this session
+        new_files = [f for f in uploaded_files or [] if (f.name, f.size) not in st.session_state.ingested_files]
+        if new_files:
+            progress_bars = {stage: st.progress(0.0, text=stage) for stage in STAGES}
+
+            def update_progress(stage: str, done: int, total: int):
+                progress_bars[stage].progress(done / total, text=f"{stage}: {done}/{total}")
+
+            try:
+                # PDFs are parsed from the uploaded bytes; nothing is written to disk
+                sources = [DocumentSource(name=f.name, data=f.getvalue()) for f in new_files]
+                report = process_documents(sources, on_progress=update_progress)
+                if report.inserted:
+                    st.session_state.search_cache.clear()
+            except Exception as e:
+                logger.error(f"Error processing documents: {str(e)}")
+                st.error(f"Failed to process documents: {str(e)}")
+                report = None
+
+            if report is not None:
+                for name, error in report.failed.items():
+                    logger.error(f"Error processing {name}: {error}")
+                    st.error(f"Failed to process: {name}")
+                done = report.inserted + report.skipped
+                st.session_state.ingested_files.update(
+                    # A name in both lists is a same-name collision: leave those files to be retried
+                    (f.name, f.size) for f in new_files if f.name in done and f.name not in report.failed
+                )
+                timings = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in report.stage_seconds.items())
+                st.success(f"Processed {len(report.inserted)} new and {len(report.skipped)} already indexed "
+                           f"document(s), {report.num_chunks} chunks ({timings})")
+                if done:
+                    st.session_state.documents_loaded = True
+                    st.success("Documents are ready! You can now ask questions about them.")
 
     if st.session_state.documents_loaded:
         for msg in st.session_state.chat_history:
@@ -194,9 +240,9 @@ def main():
                         
                         response_stream = rag(prompt=user_input, 
                                            system_prompt=RAG_SYSTEM_PROMPT,
-                                           search=hybrid_search, 
+                                           search=reranked_chunks[:MAX_CONTEXTS], 
                                            messages=formatted_messages,
-                                           max_contexts=5, 
+                                           max_contexts=MAX_CONTEXTS, 
                                            config=st.session_state.my_config)
                         
                         full_response = ""
@@ -1,10 +1,21 @@
+import hashlib
+import time
+
+import chromadb
+import requests
 import streamlit as st
+from bs4 import BeautifulSoup
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import WebBaseLoader
 from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
 from langchain_ollama import OllamaEmbeddings
 from langchain_ollama import ChatOllama
 
+# Indexed webpages persist here, one Chroma collection per URL
+INDEX_DIR = "./webpage_index"
+# How long an index is trusted before the page is checked for changes again
+FRESHNESS_TTL_SECONDS = 600
+
 st.title("Chat with Webpage 🌐")
 st.caption("This app allows you to chat with a webpage using local llama3 and RAG")
 
@@ -15,22 +26,109 @@ ollama_endpoint = "http://127.0.0.1:11434"
 ollama_model = "llama3.1"
 ollama = ChatOllama(model=ollama_model, base_url=ollama_endpoint)
 
-if webpage_url:
+
+@st.cache_resource
+def get_chroma_client():
+    return chromadb.PersistentClient(path=INDEX_DIR)
+
+
+@st.cache_resource
+def get_embeddings():
+    return OllamaEmbeddings(model=ollama_model, base_url=ollama_endpoint)
+
+
+def collection_name(url):
+    """Chroma collection for a URL; the embedding model is part of the key, since vectors differ per model."""
+    return "page-" + hashlib.sha256(f"{ollama_model}:{url}".encode()).hexdigest()[:32]
+
+
+def fetch_if_changed(url, metadata):
+    """Fetch the page unless the server or the content hash says it is unchanged.
+
+    Returns the new (html, validators) or None if the stored index is still fresh."""
+    headers = {}
+    if metadata.get("etag"):
+        headers["If-None-Match"] = metadata["etag"]
+    if metadata.get("last_modified"):
+        headers["If-Modified-Since"] = metadata["last_modified"]
+    response = requests.get(url, headers=headers, timeout=30)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    validators = {
+        "etag": response.headers.get("ETag", ""),
+        "last_modified": response.headers.get("Last-Modified", ""),
+        "content_hash": content_hash,
+    }
+    if content_hash == metadata.get("content_hash"):
+        return None
+    return response.text, validators
+
+
+def html_to_documents(url, html):
+    """Same text and metadata as WebBaseLoader, from the already-fetched HTML."""
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {"source": url}
+    if soup.title:
+        metadata["title"] = soup.title.get_text()
+    return [Document(page_content=soup.get_text(), metadata=metadata)]
+
+
+@st.cache_resource(ttl=FRESHNESS_TTL_SECONDS, show_spinner="Checking the webpage index...")
+def get_vectorstore(url):
+    """Persistent vector store for a URL, re-indexed only when the page has changed.
+
+    Cached across reruns, so further questions reuse it until the TTL expires and
+    the page is checked again."""
+    client = get_chroma_client()
+    name = collection_name(url)
+    try:
+        collection = client.get_collection(name)
+        metadata = dict(collection.metadata or {}) if collection.count() else {}
+    except Exception:
+        metadata = {}
+
+    try:
+        changed = fetch_if_changed(url, metadata)
+    except requests.RequestException:
+        # Offline or the site is down: a stored index is better than none
+        if not metadata:
+            raise
+        changed = None
+    if changed is None:
+        return Chroma(client=client, collection_name=name, embedding_function=get_embeddings()), "cached"
+
     # 1. Load the data
-    loader = WebBaseLoader(webpage_url)
-    docs = loader.load()
+    html, validators = changed
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=10)
-    splits = text_splitter.split_documents(docs)
+    splits = text_splitter.split_documents(html_to_documents(url, html))
+
+    # 2. Create Ollama embeddings and replace the stored index
+    try:
+        client.delete_collection(name)
+    except Exception:
+        pass
+    vectorstore = Chroma(
+        client=client,
+        collection_name=name,
+        embedding_function=get_embeddings(),
+        collection_metadata={"url": url},
+    )
+    vectorstore.add_documents(splits)
+    # Validators are only stored once every chunk is in, so a partial index is never served as up to date
+    client.get_collection(name).modify(metadata={"url": url, "indexed_at": time.time(), **validators})
+    return vectorstore, "indexed" if not metadata else "re-indexed"
+
 
-    # 2. Create Ollama embeddings and vector store
-    embeddings = OllamaEmbeddings(model=ollama_model, base_url=ollama_endpoint)
-    vectorstore = Chroma.from_documents(documents=splits, embedding=embeddings)
+if webpage_url:
+    vectorstore, index_status = get_vectorstore(webpage_url)
 
     # 3. Call Ollama Llama3 model
     def ollama_llm(question, context):
         """Generates a response to a question using the Ollama Llama3 model.
 
-    This function takes a question and its context, formats them into a prompt, 
+    This function takes a question and its context, formats them into a prompt,
     and invokes the Ollama Llama3 model to generate a response.
 
     Args:
@@ -69,7 +167,7 @@ if webpage_url:
         formatted_context = combine_docs(retrieved_docs)
         return ollama_llm(question, formatted_context)
 
-    st.success(f"Loaded {webpage_url} successfully!")
+    st.success(f"Loaded {webpage_url} successfully! ({index_status})")
 
     # Ask a question about the webpage
     prompt = st.text_input("Ask any question about the webpage")
@@ -0,0 +1,157 @@
+"""Compare the Qdrant collection profiles on memory, recall and latency.
+
+Loads the same vectors into one collection per profile on a local Qdrant,
+waits for indexing to finish, then runs a query set against each and reports:
+
+- vector_ram_mb: estimated RAM for the vectors the HNSW search touches
+  (float32 originals for "default", quantized vectors otherwise)
+- rss_delta_mb: growth of the Qdrant process's resident memory while the
+  collection was loaded and queried, from its /metrics endpoint. Only
+  meaningful against a Qdrant instance that nothing else is using.
+- recall@k against exact (brute-force) nearest neighbours
+- p50/p95 query latency in milliseconds
+
+Vectors are either a .npy file of real embeddings (--vectors) or synthetic,
+clustered unit vectors, which are harder for quantization than uniform noise.
+
+Usage:
+    docker run -p 6333:6333 qdrant/qdrant
+    python benchmark_collection_profiles.py --points 200000 --dim 1024 --queries 200
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Optional
+
+import httpx
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_utils.qdrant_profiles import COLLECTION_PROFILES, ensure_collection
+
+BASE_NAME = "profile-benchmark"
+
+
+def synthetic_vectors(points: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, points)] + 0.5 * rng.standard_normal((points, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def resident_bytes(url: str) -> Optional[float]:
+    try:
+        metrics = httpx.get(f"{url}/metrics", timeout=5).text
+    except httpx.HTTPError:
+        return None
+    match = re.search(r"^memory_resident_bytes\s+([0-9.e+]+)", metrics, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def wait_until_indexed(client: QdrantClient, name: str, timeout: float = 1800):
+    start = time.time()
+    while time.time() - start < timeout:
+        info = client.get_collection(name)
+        if info.status == models.CollectionStatus.GREEN and info.optimizer_status == models.OptimizersStatusOneOf.OK:
+            return
+        time.sleep(1)
+    raise TimeoutError(f"{name} was not indexed within {timeout}s")
+
+
+def vector_ram_mb(profile, points: int, dim: int) -> float:
+    bytes_per_vector = {None: dim * 4, "scalar": dim, "binary": dim / 8}[profile.quantization]
+    return points * bytes_per_vector / 2**20
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    # Vectors are unit length, so cosine similarity is a dot product
+    scores = queries @ vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def run_profile(client: QdrantClient, url: str, profile, vectors: np.ndarray, queries: np.ndarray,
+                truth: np.ndarray, k: int, batch_size: int) -> dict:
+    name = profile.collection_name(BASE_NAME)
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    rss_before = resident_bytes(url)
+
+    start = time.perf_counter()
+    ensure_collection(client, BASE_NAME, size=vectors.shape[1], profile=profile)
+    for offset in range(0, len(vectors), batch_size):
+        batch = vectors[offset:offset + batch_size]
+        client.upload_collection(
+            collection_name=name,
+            vectors=batch,
+            payload=[{"text": f"chunk {offset + i}"} for i in range(len(batch))],
+            ids=list(range(offset, offset + len(batch))),
+        )
+    wait_until_indexed(client, name)
+    index_seconds = time.perf_counter() - start
+
+    latencies, recalls = [], []
+    search_params = profile.search_params()
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = client.query_points(name, query=query.tolist(), limit=k, search_params=search_params).points
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len({hit.id for hit in hits} & set(expected.tolist())) / k)
+
+    rss_after = resident_bytes(url)
+    return {
+        "profile": profile.name,
+        "points": len(vectors),
+        "index_s": round(index_seconds, 1),
+        "vector_ram_mb": round(vector_ram_mb(profile, *vectors.shape), 1),
+        "rss_delta_mb": round((rss_after - rss_before) / 2**20, 1) if rss_before and rss_after else "n/a",
+        f"recall@{k}": round(statistics.mean(recalls), 4),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Qdrant collection profiles")
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--vectors", help="Optional .npy file of embeddings (rows are vectors)")
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--profiles", nargs="+", default=list(COLLECTION_PROFILES), choices=list(COLLECTION_PROFILES))
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark collections afterwards")
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    else:
+        vectors = synthetic_vectors(args.points + args.queries, args.dim)
+    # Held-out vectors act as queries, so no query is its own nearest neighbour
+    queries, vectors = vectors[:args.queries], vectors[args.queries:]
+    truth = exact_neighbours(vectors, queries, args.k)
+
+    client = QdrantClient(url=args.url, timeout=120)
+    rows = []
+    for name in args.profiles:
+        profile = COLLECTION_PROFILES[name]
+        print(f"Loading {len(vectors)} vectors into the {name} profile...", file=sys.stderr)
+        rows.append(run_profile(client, args.url, profile, vectors, queries, truth, args.k, args.batch_size))
+        if not args.keep:
+            client.delete_collection(profile.collection_name(BASE_NAME))
+
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(row[c])) for row in rows)) for c in columns}
+    print(" | ".join(c.ljust(widths[c]) for c in columns))
+    print("-+-".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print(" | ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
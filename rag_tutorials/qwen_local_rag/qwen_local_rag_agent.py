@@ -1,7 +1,8 @@
 import os
+import sys
 import tempfile
 from datetime import datetime
-from typing import List
+from typing import List, Tuple
 import streamlit as st
 import bs4
 from agno.agent import Agent
@@ -10,13 +11,20 @@ from langchain_community.document_loaders import PyPDFLoader, WebBaseLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
-from langchain_core.embeddings import Embeddings
+from ollama import Client as OllamaClient
 from agno.tools.exa import ExaTools
-from agno.embedder.ollama import OllamaEmbedder
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_utils.batched_embeddings import BatchedEmbeddings
+from rag_utils.chunk_dedup import ChunkDeduplicator, DedupConfig, DedupReport, drop_redundant
+from rag_utils.qdrant_profiles import COLLECTION_PROFILES, ensure_collection
+
+
+class OllamaEmbedderr(BatchedEmbeddings):
+    # Ollama's /api/embed takes a list of inputs; a couple of requests in flight keeps the local server busy
+    max_batch_size = 64
+    max_concurrency = 2
 
-class OllamaEmbedderr(Embeddings):
     def __init__(self, model_name="snowflake-arctic-embed"):
         """
         Initialize the OllamaEmbedderr with a specific model.
@@ -24,13 +32,11 @@ class OllamaEmbedderr(Embeddings):
         Args:
             model_name (str): The name of the model to use for embedding.
         """
-        self.embedder = OllamaEmbedder(id=model_name, dimensions=1024)
-
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        return [self.embed_query(text) for text in texts]
+        self.model_name = model_name
+        self.client = OllamaClient()
 
-    def embed_query(self, text: str) -> List[float]:
-        return self.embedder.get_embedding(text)
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed(model=self.model_name, input=texts)["embeddings"]
 
 
 # Constants
@@ -62,6 +68,11 @@ if 'force_web_search' not in st.session_state:
     st.session_state.force_web_search = False
 if 'similarity_threshold' not in st.session_state:
     st.session_state.similarity_threshold = 0.7
+if 'collection_profile' not in st.session_state:
+    st.session_state.collection_profile = "default"
+if 'deduplicator' not in st.session_state:
+    # Remembers every indexed chunk, so later uploads are checked against earlier ones
+    st.session_state.deduplicator = ChunkDeduplicator()
 if 'rag_enabled' not in st.session_state:
     st.session_state.rag_enabled = True  # RAG is enabled by default
 
@@ -108,6 +119,47 @@ if st.session_state.rag_enabled:
         help="Lower values will return more documents but might be less relevant. Higher values are more strict."
     )
 
+    profile_name = st.sidebar.selectbox(
+        "Collection profile",
+        options=list(COLLECTION_PROFILES),
+        index=list(COLLECTION_PROFILES).index(st.session_state.collection_profile),
+        format_func=lambda name: f"{name} - {COLLECTION_PROFILES[name].description}",
+        help="Large-corpus profiles quantize vectors and keep originals and payloads on disk, "
+             "so hundreds of thousands of chunks fit in laptop RAM"
+    )
+    if profile_name != st.session_state.collection_profile:
+        # Each profile has its own collection, so documents must be indexed again
+        st.session_state.collection_profile = profile_name
+        st.session_state.vector_store = None
+        st.session_state.processed_documents = []
+        st.session_state.deduplicator = ChunkDeduplicator()
+
+    st.sidebar.header("🧹 Deduplication")
+    dedup_method = st.sidebar.selectbox(
+        "Near-duplicate detection",
+        options=["minhash", "simhash", "none"],
+        format_func={"minhash": "MinHash", "simhash": "SimHash", "none": "Exact matches only"}.get,
+        help="Exact duplicates are always dropped before embedding"
+    )
+    jaccard_threshold = st.sidebar.slider(
+        "MinHash similarity threshold", min_value=0.5, max_value=1.0, value=0.85,
+        help="Chunks whose estimated word-shingle overlap reaches this value count as duplicates"
+    )
+    simhash_max_distance = st.sidebar.slider(
+        "SimHash max bit distance", min_value=0, max_value=7, value=3,
+        help="Chunks whose 64-bit SimHashes differ in at most this many bits count as duplicates"
+    )
+    # Method and thresholds are applied at lookup time, so the existing signatures stay valid
+    st.session_state.deduplicator.config = DedupConfig(
+        near_method=dedup_method,
+        jaccard_threshold=jaccard_threshold,
+        simhash_max_distance=simhash_max_distance
+    )
+    dedup_totals = st.session_state.deduplicator.totals
+    if dedup_totals.total:
+        st.sidebar.caption(f"Skipped {dedup_totals.removed} of {dedup_totals.total} chunks "
+                           f"({dedup_totals.requests_saved(OllamaEmbedderr.max_batch_size)} embedding requests saved)")
+
 # Add in the sidebar configuration section, after the existing API inputs
 
 st.sidebar.header("🌍 Web Search")
@@ -204,28 +256,40 @@ def process_web(url: str) -> List:
         return []
 
 
+def deduplicate_chunks(texts: List) -> Tuple[List, DedupReport]:
+    """Drop chunks that duplicate each other or anything already indexed, and report the savings.
+
+    Nothing is remembered yet: call `remember_chunks` once the kept chunks are stored,
+    so a failed upload can be retried with the same file.
+    """
+    kept, report = st.session_state.deduplicator.filter(texts, remember=False)
+    if report.removed:
+        st.info(f"🧹 Skipped {report.exact_duplicates} exact and {report.near_duplicates} near-duplicate "
+                f"chunks of {report.total} ({report.removed} texts and "
+                f"{report.requests_saved(OllamaEmbedderr.max_batch_size)} embedding requests saved)")
+    return kept, report
+
+
+def remember_chunks(texts: List, report: DedupReport):
+    """Record stored chunks, so later uploads are checked against them."""
+    st.session_state.deduplicator.remember(texts, report)
+
+
 # Vector Store Management
-def create_vector_store(client, texts):
-    """Create and initialize vector store with documents."""
+def create_vector_store(client, texts, profile: str = "default"):
+    """Create and initialize vector store with documents, using the given collection profile."""
     try:
         # Create collection if needed
-        try:
-            client.create_collection(
-                collection_name=COLLECTION_NAME,
-                vectors_config=VectorParams(
-                    size=1024,  
-                    distance=Distance.COSINE
-                )
-            )
-            st.success(f"📚 Created new collection: {COLLECTION_NAME}")
-        except Exception as e:
-            if "already exists" not in str(e).lower():
-                raise e
+        collection_name, created = ensure_collection(
+            client, COLLECTION_NAME, size=1024, profile=COLLECTION_PROFILES[profile]
+        )
+        if created:
+            st.success(f"📚 Created new collection: {collection_name} ({profile} profile)")
         
         # Initialize vector store
         vector_store = QdrantVectorStore(
             client=client,
-            collection_name=COLLECTION_NAME,
+            collection_name=collection_name,
             embedding=OllamaEmbedderr()
         )
         
@@ -326,27 +390,37 @@ if st.session_state.rag_enabled:
             if uploaded_files:
                 st.write(f"Processing {len(uploaded_files)} PDF file(s)...")
                 all_texts = []
+                new_files = []
                 for file in uploaded_files:
                     if file.name not in st.session_state.processed_documents:
                         with st.spinner(f"Processing {file.name}... "): 
                             texts = process_pdf(file)
                             if texts: 
                                 all_texts.extend(texts)
-                                st.session_state.processed_documents.append(file.name)
+                                new_files.append(file.name)
                     else:
                         st.write(f"📄 {file.name} already processed.")
                 
+                all_texts, dedup_report = deduplicate_chunks(all_texts)
                 if all_texts:
                     with st.spinner("Creating vector store..."):
-                        st.session_state.vector_store = create_vector_store(qdrant_client, all_texts)
+                        st.session_state.vector_store = create_vector_store(qdrant_client, all_texts, st.session_state.collection_profile)
+                # Files only count as processed once their chunks are stored, so a failed upload can be retried
+                if st.session_state.vector_store or not all_texts:
+                    remember_chunks(all_texts, dedup_report)
+                    st.session_state.processed_documents.extend(new_files)
 
             if url_input:
                 if url_input not in st.session_state.processed_documents:
                     with st.spinner(f"Scraping and processing {url_input}..."):
                         texts = process_web(url_input)
                         if texts:
-                            st.session_state.vector_store = create_vector_store(qdrant_client, texts)
-                            st.session_state.processed_documents.append(url_input)
+                            texts, dedup_report = deduplicate_chunks(texts)
+                            if texts:
+                                st.session_state.vector_store = create_vector_store(qdrant_client, texts, st.session_state.collection_profile)
+                            if st.session_state.vector_store or not texts:
+                                remember_chunks(texts, dedup_report)
+                                st.session_state.processed_documents.append(url_input)
                 else:
                     st.write(f"🔗 {url_input} already processed.")
                     
@@ -391,11 +465,13 @@ if prompt:
                 retriever = st.session_state.vector_store.as_retriever(
                     search_type="similarity_score_threshold",
                     search_kwargs={
-                        "k": 5, 
-                        "score_threshold": st.session_state.similarity_threshold
+                        "k": 10, 
+                        "score_threshold": st.session_state.similarity_threshold,
+                        "search_params": COLLECTION_PROFILES[st.session_state.collection_profile].search_params()
                     }
                 )
-                docs = retriever.invoke(rewritten_query)
+                # Over-fetch, then keep the 5 best contexts that are not near-copies of each other
+                docs = drop_redundant(retriever.invoke(rewritten_query), st.session_state.deduplicator.config)[:5]
                 if docs:
                     context = "\n\n".join([d.page_content for d in docs])
                     st.info(f"📊 Found {len(docs)} relevant documents (similarity > {st.session_state.similarity_threshold})")
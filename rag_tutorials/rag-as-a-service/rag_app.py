@@ -1,58 +1,146 @@
 import streamlit as st
 import requests
-from anthropic import Anthropic
+import httpx
+import asyncio
+import threading
+from anthropic import Anthropic, AsyncAnthropic
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple
 from urllib.parse import urlparse
 
+# API endpoints
+RAGIE_UPLOAD_URL = "https://api.ragie.ai/documents/url"
+RAGIE_RETRIEVAL_URL = "https://api.ragie.ai/retrievals"
+ANTHROPIC_MODEL = "claude-3-sonnet-20240229"
+
+# Responses worth retrying: rate limited or a temporarily unavailable upstream
+RETRY_STATUSES = (429, 502, 503, 504)
+# Uploads are not idempotent: a gateway error or a read timeout may follow an upload Ragie accepted, so
+# they are only retried when the request was certainly not processed (rate limited, or never connected)
+UPLOAD_RETRY_STATUSES = (429,)
+UPLOAD_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+REQUEST_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+def document_name(url: str, name: Optional[str] = None) -> str:
+    return name or urlparse(url).path.split('/')[-1] or "document"
+
+def create_system_prompt(chunk_texts: List[str]) -> str:
+    """
+    Create the system prompt with the retrieved chunks.
+    """
+    return f"""These are very important to follow: You are "Ragie AI", a professional but friendly AI chatbot working as an assistant to the user. Your current task is to help the user based on all of the information available to you shown below. Answer informally, directly, and concisely without a heading or greeting but include everything relevant. Use richtext Markdown when appropriate including bold, italic, paragraphs, and lists when helpful. If using LaTeX, use double $$ as delimiter instead of single $. Use $$...$$ instead of parentheses. Organize information into multiple sections or points when appropriate. Don't include raw item IDs or other raw fields from the source. Don't use XML or other markup unless requested by the user. Here is all of the information available to answer the user: === {chunk_texts} === If the user asked for a search and there are no results, make sure to let the user know that you couldn't find anything, and what they might be able to do to find the information they need. END SYSTEM INSTRUCTIONS"""
+
+class RetrievalCache:
+    """
+    LRU cache of retrieved chunks keyed by (query, scope), with a TTL so newly indexed documents show up.
+
+    Ragie indexes an upload asynchronously, so after `clear()` results are not cached for
+    `settle_seconds`: they may predate the new document.
+    """
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300, settle_seconds: float = 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.settle_seconds = settle_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[str]]]" = OrderedDict()
+        self._cleared_at = float("-inf")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(query: str, scope: str) -> Tuple[str, str]:
+        # Only whitespace is folded: case can matter to retrieval ("US" vs "us")
+        return " ".join(query.split()), scope
+
+    def get(self, query: str, scope: str) -> Optional[List[str]]:
+        key = self._key(query, scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, query: str, scope: str, chunks: List[str]):
+        with self._lock:
+            if time.monotonic() - self._cleared_at < self.settle_seconds:
+                return
+            self._entries[self._key(query, scope)] = (time.monotonic(), chunks)
+            self._entries.move_to_end(self._key(query, scope))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._cleared_at = time.monotonic()
+
 class RAGPipeline:
-    def __init__(self, ragie_api_key: str, anthropic_api_key: str):
+    def __init__(self, ragie_api_key: str, anthropic_api_key: str, retrieval_cache: Optional[RetrievalCache] = None):
         """
         Initialize the RAG pipeline with API keys.
         """
         self.ragie_api_key = ragie_api_key
         self.anthropic_api_key = anthropic_api_key
         self.anthropic_client = Anthropic(api_key=anthropic_api_key)
+        self.retrieval_cache = retrieval_cache or RetrievalCache()
         
-        # API endpoints
-        self.RAGIE_UPLOAD_URL = "https://api.ragie.ai/documents/url"
-        self.RAGIE_RETRIEVAL_URL = "https://api.ragie.ai/retrievals"
+        # One pooled session for every Ragie call, retrying rate limits and gateway errors with backoff.
+        # Document uploads get their own adapter that only retries rate limits and connection failures.
+        self.session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=None, respect_retry_after_header=True)
+        upload_retry = Retry(total=3, connect=3, read=0, other=0, backoff_factor=0.5,
+                             status_forcelist=UPLOAD_RETRY_STATUSES, allowed_methods=None,
+                             respect_retry_after_header=True)
+        self.session.mount("https://", HTTPAdapter(max_retries=retry, pool_maxsize=10))
+        self.session.mount(RAGIE_UPLOAD_URL, HTTPAdapter(max_retries=upload_retry, pool_maxsize=10))
+        self.session.headers.update({
+            "accept": "application/json",
+            "authorization": f"Bearer {self.ragie_api_key}"
+        })
+        self.timeout = (10, 60)
     
     def upload_document(self, url: str, name: Optional[str] = None, mode: str = "fast") -> Dict:
         """
         Upload a document to Ragie from a URL.
         """
-        if not name:
-            name = urlparse(url).path.split('/')[-1] or "document"
-            
         payload = {
             "mode": mode,
-            "name": name,
+            "name": document_name(url, name),
             "url": url
         }
         
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "authorization": f"Bearer {self.ragie_api_key}"
-        }
-        
-        response = requests.post(self.RAGIE_UPLOAD_URL, json=payload, headers=headers)
+        response = self.session.post(RAGIE_UPLOAD_URL, json=payload, timeout=self.timeout)
         
         if not response.ok:
             raise Exception(f"Document upload failed: {response.status_code} {response.reason}")
-            
+        
+        # New content may change retrieval results
+        self.retrieval_cache.clear()
         return response.json()
+
+    def upload_documents(self, urls: List[str], mode: str = "fast", max_concurrency: int = 4,
+                         requests_per_second: float = 2.0) -> List[Dict]:
+        """
+        Upload many documents concurrently, within a rate limit. Returns one result per URL,
+        either the Ragie response or {"error": ...}.
+        """
+        async def run():
+            async with AsyncRAGPipeline(self.ragie_api_key, self.anthropic_api_key, self.retrieval_cache) as pipeline:
+                return await pipeline.upload_documents(urls, mode, max_concurrency, requests_per_second)
+        return asyncio.run(run())
     
     def retrieve_chunks(self, query: str, scope: str = "tutorial") -> List[str]:
         """
         Retrieve relevant chunks from Ragie for a given query.
         """
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.ragie_api_key}"
-        }
-        
+        cached = self.retrieval_cache.get(query, scope)
+        if cached is not None:
+            return cached
+
         payload = {
             "query": query,
             "filters": {
@@ -60,30 +148,25 @@ class RAGPipeline:
             }
         }
         
-        response = requests.post(
-            self.RAGIE_RETRIEVAL_URL,
-            headers=headers,
-            json=payload
-        )
+        response = self.session.post(RAGIE_RETRIEVAL_URL, json=payload, timeout=self.timeout)
         
         if not response.ok:
             raise Exception(f"Retrieval failed: {response.status_code} {response.reason}")
             
         data = response.json()
-        return [chunk["text"] for chunk in data["scored_chunks"]]
+        chunks = [chunk["text"] for chunk in data["scored_chunks"]]
+        self.retrieval_cache.put(query, scope, chunks)
+        return chunks
 
     def create_system_prompt(self, chunk_texts: List[str]) -> str:
-        """
-        Create the system prompt with the retrieved chunks.
-        """
-        return f"""These are very important to follow: You are "Ragie AI", a professional but friendly AI chatbot working as an assistant to the user. Your current task is to help the user based on all of the information available to you shown below. Answer informally, directly, and concisely without a heading or greeting but include everything relevant. Use richtext Markdown when appropriate including bold, italic, paragraphs, and lists when helpful. If using LaTeX, use double $$ as delimiter instead of single $. Use $$...$$ instead of parentheses. Organize information into multiple sections or points when appropriate. Don't include raw item IDs or other raw fields from the source. Don't use XML or other markup unless requested by the user. Here is all of the information available to answer the user: === {chunk_texts} === If the user asked for a search and there are no results, make sure to let the user know that you couldn't find anything, and what they might be able to do to find the information they need. END SYSTEM INSTRUCTIONS"""
+        return create_system_prompt(chunk_texts)
 
-    def generate_response(self, system_prompt: str, query: str) -> str:
+    def generate_response(self, system_prompt: str, query: str) -> Iterator[str]:
         """
-        Generate response using Claude 3.5 Sonnet.
+        Stream the response from Claude, yielding text as it arrives.
         """
-        message = self.anthropic_client.messages.create(
-            model="claude-3-sonnet-20240229",
+        with self.anthropic_client.messages.stream(
+            model=ANTHROPIC_MODEL,
             max_tokens=1024,
             system=system_prompt,
             messages=[
@@ -92,21 +175,139 @@ class RAGPipeline:
                     "content": query
                 }
             ]
-        )
-        
-        return message.content[0].text
+        ) as stream:
+            yield from stream.text_stream
 
-    def process_query(self, query: str, scope: str = "tutorial") -> str:
+    def process_query(self, query: str, scope: str = "tutorial") -> Iterator[str]:
         """
-        Process a query through the complete RAG pipeline.
+        Process a query through the complete RAG pipeline, yielding response tokens as they arrive.
         """
         chunks = self.retrieve_chunks(query, scope)
         
         if not chunks:
-            return "No relevant information found for your query."
+            yield "No relevant information found for your query."
+            return
         
         system_prompt = self.create_system_prompt(chunks)
-        return self.generate_response(system_prompt, query)
+        yield from self.generate_response(system_prompt, query)
+
+class AsyncRateLimiter:
+    """
+    Spaces request starts at least 1 / requests_per_second apart.
+    """
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class AsyncRAGPipeline:
+    """
+    Async variant of RAGPipeline with a pooled HTTP client, for concurrent uploads and queries.
+    Use it as an async context manager so the connection pool is closed.
+    """
+    def __init__(self, ragie_api_key: str, anthropic_api_key: str, retrieval_cache: Optional[RetrievalCache] = None,
+                 max_connections: int = 10, max_retries: int = 3):
+        self.retrieval_cache = retrieval_cache or RetrievalCache()
+        self.max_retries = max_retries
+        self.anthropic_client = AsyncAnthropic(api_key=anthropic_api_key)
+        self.http = httpx.AsyncClient(
+            headers={"accept": "application/json", "authorization": f"Bearer {ragie_api_key}"},
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+        await self.anthropic_client.close()
+
+    async def _post(self, url: str, payload: Dict, action: str, idempotent: bool = True) -> Dict:
+        """
+        POST to Ragie, retrying transport errors, rate limits and gateway errors with backoff.
+        Non-idempotent requests are only retried when they were certainly not processed.
+        """
+        retry_errors = httpx.TransportError if idempotent else UPLOAD_RETRY_ERRORS
+        retry_statuses = RETRY_STATUSES if idempotent else UPLOAD_RETRY_STATUSES
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = await self.http.post(url, json=payload)
+            except retry_errors:
+                if last_attempt:
+                    raise
+                delay = 0.5 * 2 ** attempt
+            else:
+                if response.status_code not in retry_statuses or last_attempt:
+                    if response.is_error:
+                        raise Exception(f"{action} failed: {response.status_code} {response.reason_phrase}")
+                    return response.json()
+                retry_after = response.headers.get("retry-after", "")
+                delay = float(retry_after) if retry_after.isdigit() else 0.5 * 2 ** attempt
+            await asyncio.sleep(delay)
+
+    async def upload_document(self, url: str, name: Optional[str] = None, mode: str = "fast") -> Dict:
+        result = await self._post(RAGIE_UPLOAD_URL, {"mode": mode, "name": document_name(url, name), "url": url},
+                                  "Document upload", idempotent=False)
+        self.retrieval_cache.clear()
+        return result
+
+    async def upload_documents(self, urls: List[str], mode: str = "fast", max_concurrency: int = 4,
+                               requests_per_second: float = 2.0) -> List[Dict]:
+        """
+        Upload many documents concurrently, within a rate limit. Results are in the order of `urls`.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        limiter = AsyncRateLimiter(requests_per_second)
+
+        async def upload(url):
+            async with semaphore:
+                await limiter.wait()
+                try:
+                    return await self.upload_document(url, mode=mode)
+                except Exception as e:
+                    return {"error": str(e), "url": url}
+
+        return await asyncio.gather(*(upload(url) for url in urls))
+
+    async def retrieve_chunks(self, query: str, scope: str = "tutorial") -> List[str]:
+        cached = self.retrieval_cache.get(query, scope)
+        if cached is not None:
+            return cached
+        data = await self._post(RAGIE_RETRIEVAL_URL, {"query": query, "filters": {"scope": scope}}, "Retrieval")
+        chunks = [chunk["text"] for chunk in data["scored_chunks"]]
+        self.retrieval_cache.put(query, scope, chunks)
+        return chunks
+
+    async def generate_response(self, system_prompt: str, query: str) -> AsyncIterator[str]:
+        async with self.anthropic_client.messages.stream(
+            model=ANTHROPIC_MODEL,
+            max_tokens=1024,
+            system=system_prompt,
+            messages=[{"role": "user", "content": query}]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+    async def process_query(self, query: str, scope: str = "tutorial") -> AsyncIterator[str]:
+        chunks = await self.retrieve_chunks(query, scope)
+        if not chunks:
+            yield "No relevant information found for your query."
+            return
+        async for text in self.generate_response(create_system_prompt(chunks), query):
+            yield text
 
 def initialize_session_state():
     """Initialize session state variables."""
@@ -145,19 +346,20 @@ def main():
     # Document Upload Section
     if st.session_state.api_keys_submitted:
         st.markdown("### 📄 Document Upload")
-        doc_url = st.text_input("Enter document URL")
-        doc_name = st.text_input("Document name (optional)")
+        doc_urls = st.text_area("Enter document URLs (one per line)")
+        doc_name = st.text_input("Document name (optional, single URL only)")
         
         col1, col2 = st.columns([1, 3])
         with col1:
             upload_mode = st.selectbox("Upload mode", ["fast", "accurate"])
         
         if st.button("Upload Document"):
-            if doc_url:
+            urls = [url.strip() for url in doc_urls.splitlines() if url.strip()]
+            if len(urls) == 1:
                 try:
                     with st.spinner("Uploading document..."):
                         st.session_state.pipeline.upload_document(
-                            url=doc_url,
+                            url=urls[0],
                             name=doc_name if doc_name else None,
                             mode=upload_mode
                         )
@@ -166,6 +368,17 @@ def main():
                         st.success("Document uploaded and indexed successfully!")
                 except Exception as e:
                     st.error(f"Error uploading document: {str(e)}")
+            elif urls:
+                # Many URLs: upload concurrently over one pooled client, within Ragie's rate limit
+                with st.spinner(f"Uploading {len(urls)} documents..."):
+                    results = st.session_state.pipeline.upload_documents(urls, mode=upload_mode)
+                    failed = [result for result in results if "error" in result]
+                    if len(failed) < len(urls):
+                        time.sleep(5)  # Wait for indexing
+                        st.session_state.document_uploaded = True
+                        st.success(f"{len(urls) - len(failed)} of {len(urls)} documents uploaded and indexed successfully!")
+                    for result in failed:
+                        st.error(f"Error uploading {result['url']}: {result['error']}")
             else:
                 st.error("Please provide a document URL.")
     
@@ -177,10 +390,9 @@ def main():
         if st.button("Generate Response"):
             if query:
                 try:
-                    with st.spinner("Generating response..."):
-                        response = st.session_state.pipeline.process_query(query)
-                        st.markdown("### Response:")
-                        st.markdown(response)
+                    st.markdown("### Response:")
+                    # Tokens are rendered as Claude streams them
+                    st.write_stream(st.session_state.pipeline.process_query(query))
                 except Exception as e:
                     st.error(f"Error generating response: {str(e)}")
             else:
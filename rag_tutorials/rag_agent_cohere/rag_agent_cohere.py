@@ -1,4 +1,5 @@
 import os
+import sys
 import streamlit as st
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -11,12 +12,13 @@ from langchain.chains import create_retrieval_chain
 from langchain import hub
 import tempfile
 from langgraph.prebuilt import create_react_agent
-from langchain_community.tools import DuckDuckGoSearchRun
 from typing import TypedDict, List
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from time import sleep
-from tenacity import retry, wait_exponential, stop_after_attempt
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_utils.embedding_cache import CachedEmbeddings
+from rag_utils.web_search import get_web_search_client
 
 
 def init_session_state():
@@ -81,8 +83,8 @@ if not sidebar_api_form():
     st.info("Please enter your API credentials in the sidebar to continue.")
     st.stop()
 
-embedding = CohereEmbeddings(model="embed-english-v3.0",
-                            cohere_api_key=st.session_state.cohere_api_key)
+embedding = CachedEmbeddings(CohereEmbeddings(model="embed-english-v3.0",
+                                             cohere_api_key=st.session_state.cohere_api_key))
 
 chat_model = ChatCohere(model="command-r7b-12-2024",
                        temperature=0.1,
@@ -131,6 +133,8 @@ def create_vector_stores(texts):
         with st.spinner('Storing documents in Qdrant...'):
             vector_store.add_documents(texts)
             st.success("Documents successfully stored in Qdrant!")
+            st.caption(f"Embedding cache hit rate: {embedding.hit_rate:.0%} "
+                       f"({embedding.hits} hits, {embedding.misses} misses)")
         
         return vector_store
         
@@ -144,29 +148,13 @@ class AgentState(TypedDict):
     messages: List[HumanMessage | AIMessage | SystemMessage]
     is_last_step: bool
 
-class RateLimitedDuckDuckGo(DuckDuckGoSearchRun):
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10),
-           stop=stop_after_attempt(3))
-    def run(self, query: str) -> str:
-        """Run search with rate limiting."""
-        try:
-            sleep(2)  # Add delay between requests
-            return super().run(query)
-        except Exception as e:
-            if "Ratelimit" in str(e):
-                sleep(5)  # Longer delay on rate limit
-                return super().run(query)
-            raise e
-
 def create_fallback_agent(chat_model: BaseLanguageModel):
     """Create a LangGraph agent for web research."""
     
     def web_research(query: str) -> str:
         """Web search with result formatting."""
         try:
-            search = DuckDuckGoSearchRun(num_results=5)
-            results = search.run(query)
-            return results
+            return get_web_search_client().run(query)
         except Exception as e:
             return f"Search failed: {str(e)}. Providing answer based on general knowledge."
 
@@ -1,18 +1,23 @@
+import hashlib
 import os
+import sys
 import streamlit as st
 
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters.sentence_transformers import SentenceTransformersTokenTextSplitter
+from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_utils.embedding_cache import CachedEmbeddings
+from rag_utils.pdf_buffers import load_pdf_documents
 
-# Initialize embedding model
-embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+# Initialize embedding model, serving previously embedded text from the local cache
+embedding_model = CachedEmbeddings(GoogleGenerativeAIEmbeddings(model="models/embedding-001"))
 
 # Initialize pharma database
 db = Chroma(collection_name="pharma_database",
@@ -30,53 +35,81 @@ def format_docs(docs):
         separated by double newlines."""
     return "\n\n".join(doc.page_content for doc in docs)
 
+# Chunks written to Chroma per add_documents call
+WRITE_BATCH_SIZE = 256
+
+@st.cache_resource
+def get_text_splitter():
+    """Loads the sentence-transformer splitter once per process instead of once per file."""
+    return SentenceTransformersTokenTextSplitter(
+        model_name="sentence-transformers/all-mpnet-base-v2",
+        chunk_size=100,
+        chunk_overlap=50
+    )
+
+def split_pages(page_texts, page_metadata):
+    """Splits pages into token windows, tokenizing and decoding all pages in one batch each.
+
+    Produces the same chunks as SentenceTransformersTokenTextSplitter.create_documents,
+    which tokenizes one text at a time."""
+    splitter = get_text_splitter()
+    tokenizer = splitter.tokenizer
+    step = splitter.tokens_per_chunk - splitter._chunk_overlap
+    token_ids = tokenizer(page_texts, add_special_tokens=False, truncation=False)["input_ids"]
+
+    windows, metadata = [], []
+    for ids, meta in zip(token_ids, page_metadata):
+        for start in range(0, max(len(ids), 1), step):
+            windows.append(ids[start:start + splitter.tokens_per_chunk])
+            metadata.append(dict(meta))
+            if start + splitter.tokens_per_chunk >= len(ids):
+                break
+    texts = tokenizer.batch_decode(windows)
+    return [Document(page_content=text, metadata=meta) for text, meta in zip(texts, metadata) if text.strip()]
+
+def chunk_id(chunk):
+    """Content-hash ID, so re-uploading a file maps its chunks onto the existing vectors."""
+    return hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+
 def add_to_db(uploaded_files):
     """Processes and adds uploaded PDF files to the database.
 
     This function checks if any files have been uploaded. If files are uploaded,
-    it saves each file to a temporary location, processes the content using a PDF loader,
-    and splits the content into smaller chunks. Each chunk, along with its metadata, 
-    is then added to the database. Temporary files are removed after processing.
+    it parses each file's pages straight from the uploaded bytes, without a temporary
+    file, and splits the pages of all files into smaller chunks in one batch. Chunks
+    are keyed by a hash of their content; chunks already in the database are skipped
+    and the rest are written in batches.
 
     Args:
         uploaded_files (list): A list of uploaded file objects to be processed.
 
     Returns:
-        None"""
+        tuple: The number of chunks added and the number already in the database."""
     # Check if files are uploaded
     if not uploaded_files:
         st.error("No files uploaded!")
-        return
+        return 0, 0
 
-    for uploaded_file in uploaded_files:
-        # Save the uploaded file to a temporary path
-        temp_file_path = os.path.join("./temp", uploaded_file.name)
-        os.makedirs(os.path.dirname(temp_file_path), exist_ok=True)
+    # Uploads are in-memory streams, so pypdf reads them without a temporary file
+    pages = [page for uploaded_file in uploaded_files
+             for page in load_pdf_documents(uploaded_file, source=uploaded_file.name)]
 
-        with open(temp_file_path, "wb") as temp_file:
-            temp_file.write(uploaded_file.getbuffer())
-
-        # Load the file using PyPDFLoader
-        loader = PyPDFLoader(temp_file_path)
-        data = loader.load()
-
-        # Store metadata and content
-        doc_metadata = [data[i].metadata for i in range(len(data))]
-        doc_content = [data[i].page_content for i in range(len(data))]
-
-        # Split documents into smaller chunks
-        st_text_splitter = SentenceTransformersTokenTextSplitter(
-            model_name="sentence-transformers/all-mpnet-base-v2",
-            chunk_size=100,
-            chunk_overlap=50
-        )
-        st_chunks = st_text_splitter.create_documents(doc_content, doc_metadata)
+    # Split documents into smaller chunks
+    st_chunks = split_pages([page.page_content for page in pages], [page.metadata for page in pages])
 
-        # Add chunks to database
-        db.add_documents(st_chunks)
+    # Identical chunks (within this upload or from earlier uploads) are stored once
+    unique_chunks = {chunk_id(chunk): chunk for chunk in st_chunks}
+    ids = list(unique_chunks)
+    existing = set()
+    for start in range(0, len(ids), WRITE_BATCH_SIZE):
+        existing.update(db.get(ids=ids[start:start + WRITE_BATCH_SIZE], include=[])["ids"])
+    new_ids = [i for i in ids if i not in existing]
 
-        # Remove the temporary file after processing
-        os.remove(temp_file_path)
+    # Add chunks to database
+    for start in range(0, len(new_ids), WRITE_BATCH_SIZE):
+        batch_ids = new_ids[start:start + WRITE_BATCH_SIZE]
+        db.add_documents([unique_chunks[i] for i in batch_ids], ids=batch_ids)
+    return len(new_ids), len(existing)
 
 def run_rag_chain(query):
     """Processes a query using a Retrieval-Augmented Generation (RAG) chain.
@@ -190,8 +223,11 @@ def main():
 
             else:
                 with st.spinner("Processing your documents..."):
-                    add_to_db(pdf_docs)
+                    added, existing = add_to_db(pdf_docs)
                     st.success(":file_folder: Documents successfully added to the database!")
+                    st.caption(f"{added} new chunks stored, {existing} already in the database")
+                    st.caption(f"Embedding cache hit rate: {embedding_model.hit_rate:.0%} "
+                               f"({embedding_model.hits} hits, {embedding_model.misses} misses)")
 
     # Sidebar Footer
     st.sidebar.write("Built with ❤️ by [Charan](https://www.linkedin.com/in/codewithcharan/)")
@@ -0,0 +1,126 @@
+"""Compare the centroid router with per-collection similarity search routing.
+
+Runs a labelled question set against the app's Qdrant collections and
+reports, for each approach:
+
+- accuracy: share of questions routed to the expected collection
+- llm_fallback: share left without a confident route (these would go to the LLM router)
+- embed_calls: question embeddings computed per question
+- p50/p95 routing latency in milliseconds, including embedding
+
+"similarity_search" is the previous approach: `similarity_search_with_score(k=3)`
+on every collection in turn, with the best average score >= 0.5 winning.
+"centroid@<min_score>" rows calibrate `CentroidRouter.min_score`: pick the
+lowest value whose accuracy matches similarity_search.
+
+The question file is JSON Lines with one {"question": ..., "db": "products" | "support" | "finance"} per line.
+
+Usage:
+    export OPENAI_API_KEY=... QDRANT_URL=... QDRANT_API_KEY=...
+    python benchmark_routing.py questions.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+from langchain_community.vectorstores import Qdrant
+from langchain_openai import OpenAIEmbeddings
+from qdrant_client import QdrantClient
+
+from centroid_router import CentroidRouter
+
+# Same collections as rag_database_routing.COLLECTIONS
+COLLECTION_NAMES = {
+    "products": "products_collection",
+    "support": "support_collection",
+    "finance": "finance_collection",
+}
+
+
+class CountingEmbeddings(OpenAIEmbeddings):
+    """Counts embed_query calls, i.e. question embeddings."""
+    query_calls: int = 0
+
+    def embed_query(self, text: str):
+        self.query_calls += 1
+        return super().embed_query(text)
+
+
+def similarity_search_route(databases, question: str, threshold: float = 0.5):
+    best_score, best_db_type = -1, None
+    for db_type, db in databases.items():
+        results = db.similarity_search_with_score(question, k=3)
+        if results:
+            avg_score = sum(score for _, score in results) / len(results)
+            if avg_score > best_score:
+                best_score, best_db_type = avg_score, db_type
+    return best_db_type if best_score >= threshold else None
+
+
+def centroid_route(router: CentroidRouter, embeddings, databases, question: str):
+    return router.route(embeddings.embed_query(question), databases).db_type
+
+
+def evaluate(name, route, questions, embeddings) -> dict:
+    latencies, correct, fallbacks = [], 0, 0
+    embeddings.query_calls = 0
+    for item in questions:
+        start = time.perf_counter()
+        db_type = route(item["question"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += db_type == item["db"]
+        fallbacks += db_type is None
+    return {
+        "router": name,
+        "questions": len(questions),
+        "accuracy": round(correct / len(questions), 3),
+        "llm_fallback": round(fallbacks / len(questions), 3),
+        "embed_calls": round(embeddings.query_calls / len(questions), 2),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query routing approaches")
+    parser.add_argument("questions", help="JSON Lines file of {question, db}")
+    parser.add_argument("--qdrant-url", default=os.environ.get("QDRANT_URL"))
+    parser.add_argument("--qdrant-api-key", default=os.environ.get("QDRANT_API_KEY"))
+    parser.add_argument("--margin", type=float, default=0.05, help="Centroid margin below which candidates are searched")
+    parser.add_argument("--min-scores", type=float, nargs="+", default=[0.3, 0.4, 0.5, 0.6],
+                        help="Centroid min_score values to compare")
+    args = parser.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+
+    client = QdrantClient(url=args.qdrant_url, api_key=args.qdrant_api_key)
+    embeddings = CountingEmbeddings(model="text-embedding-3-small")
+    databases = {db_type: Qdrant(client=client, collection_name=name, embeddings=embeddings)
+                 for db_type, name in COLLECTION_NAMES.items()}
+
+    start = time.perf_counter()
+    router = CentroidRouter(margin_threshold=args.margin)
+    for db_type, name in COLLECTION_NAMES.items():
+        router.load_collection(client, name, db_type)
+    print(f"Built centroid profiles in {time.perf_counter() - start:.1f}s: {router.point_counts()}")
+
+    rows = [evaluate("similarity_search", lambda q: similarity_search_route(databases, q), questions, embeddings)]
+    for min_score in args.min_scores:
+        router.min_score = min_score
+        rows.append(evaluate(f"centroid@{min_score}", lambda q: centroid_route(router, embeddings, databases, q),
+                             questions, embeddings))
+
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(row[c])) for row in rows)) for c in columns}
+    print(" | ".join(c.ljust(widths[c]) for c in columns))
+    print("-+-".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print(" | ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Single-embedding router over the products / support / finance collections.
+
+The question is embedded once and scored against a compact profile of each
+collection: its centroid (the normalised mean of its chunk vectors) and a
+reservoir sample of up to `max_prototypes` chunk vectors. A collection's score
+is the mean of its `top_k` best cosine similarities over those, so
+collections with several distinct topics are not washed out by the mean, and
+the score is on the same scale as the previous routing bar: the mean score of
+the top 3 similarity search results, >= 0.5.
+
+Profiles are built once from the vectors already stored in Qdrant, then
+updated incrementally from the vectors of newly added chunks. Nothing is
+re-embedded.
+
+When the top two collections are within `margin_threshold` of each other,
+the top score is below `min_score`, or only one collection has a profile (so
+there is no margin to speak of), the close candidates are searched in
+parallel with the same query vector. If that is inconclusive too, the caller
+falls back to the LLM router. `benchmark_routing.py --min-scores` reports
+accuracy and fallback rate per `min_score`, for calibration.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+@dataclass
+class RouteDecision:
+    db_type: Optional[str]
+    method: str  # "centroid", "fanout" or "none" (no confident route)
+    scores: Dict[str, float] = field(default_factory=dict)
+    margin: float = 0.0
+    latency_ms: float = 0.0
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+class _CollectionProfile:
+    """Running centroid plus a uniform reservoir sample of a collection's vectors."""
+
+    def __init__(self, max_prototypes: int, top_k: int, rng: np.random.Generator):
+        self.max_prototypes = max_prototypes
+        self.top_k = top_k
+        self.rng = rng
+        self.count = 0
+        self.vector_sum: Optional[np.ndarray] = None
+        self.prototypes: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None  # Centroid and prototypes, rebuilt lazily
+
+    def add(self, vectors: np.ndarray):
+        for vector in _normalize(vectors):
+            self.count += 1
+            self.vector_sum = vector.copy() if self.vector_sum is None else self.vector_sum + vector
+            if len(self.prototypes) < self.max_prototypes:
+                self.prototypes.append(vector)
+            else:
+                slot = self.rng.integers(0, self.count)
+                if slot < self.max_prototypes:
+                    self.prototypes[slot] = vector
+        self._matrix = None
+
+    def score(self, query: np.ndarray) -> float:
+        if self._matrix is None:
+            self._matrix = _normalize(np.vstack([self.vector_sum, *self.prototypes]))
+        similarities = self._matrix @ query
+        k = min(self.top_k, len(similarities))
+        return float(np.mean(np.partition(similarities, -k)[-k:]))
+
+
+class CentroidRouter:
+    def __init__(self, margin_threshold: float = 0.05, min_score: float = 0.5,
+                 fanout_threshold: float = 0.5, max_prototypes: int = 32, top_k: int = 3, seed: int = 0):
+        self.margin_threshold = margin_threshold
+        # Both default to the bar the per-collection similarity search routing used
+        self.min_score = min_score
+        self.fanout_threshold = fanout_threshold
+        self.max_prototypes = max_prototypes
+        self.top_k = top_k
+        self._rng = np.random.default_rng(seed)
+        self._profiles: Dict[str, _CollectionProfile] = {}
+
+    def add_vectors(self, db_type: str, vectors: Sequence[Sequence[float]]):
+        if len(vectors) == 0:
+            return
+        if db_type not in self._profiles:
+            self._profiles[db_type] = _CollectionProfile(self.max_prototypes, self.top_k, self._rng)
+        self._profiles[db_type].add(np.asarray(vectors))
+
+    def load_collection(self, client, collection_name: str, db_type: str, limit: int = 2000):
+        """Build a profile from up to `limit` vectors already stored in a Qdrant collection."""
+        offset, loaded = None, 0
+        while loaded < limit:
+            points, offset = client.scroll(collection_name, limit=min(256, limit - loaded), offset=offset,
+                                           with_vectors=True, with_payload=False)
+            self.add_vectors(db_type, [point.vector for point in points])
+            loaded += len(points)
+            if offset is None:
+                break
+
+    def add_points(self, client, collection_name: str, db_type: str, ids: Sequence):
+        """Update a profile with newly added points, reading their stored vectors back instead of re-embedding."""
+        for start in range(0, len(ids), 256):
+            points = client.retrieve(collection_name, ids=list(ids[start:start + 256]), with_vectors=True)
+            self.add_vectors(db_type, [point.vector for point in points])
+
+    def point_counts(self) -> Dict[str, int]:
+        return {db_type: profile.count for db_type, profile in self._profiles.items()}
+
+    def scores(self, query_vector: Sequence[float]) -> Dict[str, float]:
+        query = _normalize(np.asarray(query_vector))
+        return {db_type: profile.score(query) for db_type, profile in self._profiles.items()}
+
+    def route(self, query_vector: Sequence[float], databases: Dict[str, object], k: int = 3) -> RouteDecision:
+        """Pick a collection for an embedded question, searching close candidates in parallel if needed."""
+        start = time.perf_counter()
+        scores = self.scores(query_vector)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        # A single profile has nothing to be compared with, so it is never a confident route on its own
+        margin = ranked[0][1] - ranked[1][1] if len(ranked) > 1 else 0.0
+
+        if len(ranked) > 1 and ranked[0][1] >= self.min_score and margin >= self.margin_threshold:
+            return RouteDecision(ranked[0][0], "centroid", scores, margin, (time.perf_counter() - start) * 1000)
+
+        # Ambiguous: search the close candidates (every collection if there are no profiles yet)
+        if ranked:
+            candidates = [db_type for db_type, score in ranked if ranked[0][1] - score < self.margin_threshold]
+        else:
+            candidates = list(databases)
+        candidates = [db_type for db_type in candidates if db_type in databases]
+
+        def average_score(db_type):
+            results = databases[db_type].similarity_search_with_score_by_vector(list(query_vector), k=k)
+            return sum(score for _, score in results) / len(results) if results else -1.0
+
+        with ThreadPoolExecutor(max_workers=max(1, len(candidates))) as pool:
+            search_scores = dict(zip(candidates, pool.map(average_score, candidates)))
+        best = max(search_scores, key=search_scores.get) if search_scores else None
+        latency_ms = (time.perf_counter() - start) * 1000
+        if best is not None and search_scores[best] >= self.fanout_threshold:
+            return RouteDecision(best, "fanout", search_scores, margin, latency_ms)
+        return RouteDecision(None, "none", search_scores or scores, margin, latency_ms)
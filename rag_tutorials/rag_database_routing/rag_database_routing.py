@@ -1,4 +1,6 @@
 import os
+import sys
+import time
 from typing import List, Dict, Any, Literal, Optional
 from dataclasses import dataclass
 import streamlit as st
@@ -16,11 +18,15 @@ from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
 from langchain import hub
 from langgraph.prebuilt import create_react_agent
-from langchain_community.tools import DuckDuckGoSearchRun
 from langchain_core.language_models import BaseLanguageModel
 from langchain.prompts import ChatPromptTemplate
 from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams
+from centroid_router import CentroidRouter
+from routing_memory import NO_DATABASE, RoutingMemory, RoutingStats
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from rag_utils.web_search import get_web_search_client
 
 def init_session_state():
     """Initialize session state variables"""
@@ -36,11 +42,21 @@ def init_session_state():
         st.session_state.llm = None
     if 'databases' not in st.session_state:
         st.session_state.databases = {}
-
-init_session_state()
+    if 'router' not in st.session_state:
+        st.session_state.router = None
+        st.session_state.router_source = None
+    if 'routing_memory' not in st.session_state:
+        st.session_state.routing_memory = RoutingMemory(ROUTING_MEMORY_DIRECTORY)
+        st.session_state.routing_stats = RoutingStats(ROUTING_MEMORY_DIRECTORY)
+    if 'routing_agent' not in st.session_state:
+        st.session_state.routing_agent = None
 
 DatabaseType = Literal["products", "support", "finance"]
 PERSIST_DIRECTORY = "db_storage"
+# Logged routing decisions and routing events, kept across sessions
+ROUTING_MEMORY_DIRECTORY = "routing_memory"
+
+init_session_state()
 
 @dataclass
 class CollectionConfig:
@@ -102,6 +118,14 @@ def initialize_models():
                     collection_name=config.collection_name,
                     embeddings=st.session_state.embeddings
                 )
+
+            # Build the routing profiles once per Qdrant cluster, from the vectors already stored
+            if st.session_state.router_source != st.session_state.qdrant_url:
+                router = CentroidRouter()
+                for db_type, config in COLLECTIONS.items():
+                    router.load_collection(client, config.collection_name, db_type)
+                st.session_state.router = router
+                st.session_state.router_source = st.session_state.qdrant_url
             
             return True
         except Exception as e:
@@ -156,38 +180,51 @@ def create_routing_agent() -> Agent:
     )
 
 def route_query(question: str) -> Optional[DatabaseType]:
-    """Route query by searching all databases and comparing relevance scores.
+    """Route query by scoring one question embedding against per-collection centroids,
+    searching close candidates in parallel only when the margin is small.
+    Low-confidence questions go to the routing cache, then the learned classifier,
+    and only then to the LLM router.
     Returns None if no suitable database is found."""
+    start = time.perf_counter()
+    memory = st.session_state.routing_memory
+    stats = st.session_state.routing_stats
     try:
-        best_score = -1
-        best_db_type = None
-        all_scores = {}  # Store all scores for debugging
-        
-        # Search each database and compare relevance scores
-        for db_type, db in st.session_state.databases.items():
-            results = db.similarity_search_with_score(
-                question,
-                k=3
-            )
-            
-            if results:
-                avg_score = sum(score for _, score in results) / len(results)
-                all_scores[db_type] = avg_score
-                
-                if avg_score > best_score:
-                    best_score = avg_score
-                    best_db_type = db_type
-        
-        confidence_threshold = 0.5
-        if best_score >= confidence_threshold and best_db_type:
-            st.success(f"Using vector similarity routing: {best_db_type} (confidence: {best_score:.3f})")
-            return best_db_type
+        question_vector = st.session_state.embeddings.embed_query(question)
+        decision = st.session_state.router.route(question_vector, st.session_state.databases)
+
+        if decision.db_type:
+            label = "centroid" if decision.method == "centroid" else "parallel similarity search"
+            st.success(f"Using {label} routing: {decision.db_type} "
+                       f"(score: {decision.scores[decision.db_type]:.3f}, margin: {decision.margin:.3f}, "
+                       f"{decision.latency_ms:.0f} ms)")
+            memory.record(question_vector, decision.db_type, decision.method)
+            stats.add(decision.method, (time.perf_counter() - start) * 1000, decision.db_type)
+            return decision.db_type
+
+        # Low confidence: reuse earlier decisions before asking the LLM
+        db_type, similarity = memory.lookup(question_vector)
+        if db_type == NO_DATABASE:
+            st.warning(f"Cached routing decision: no suitable database (similar question, {similarity:.3f}), "
+                       "will use web search fallback")
+            stats.add("cache", (time.perf_counter() - start) * 1000, None)
+            return None
+        if db_type:
+            st.success(f"Using cached routing decision: {db_type} (similar question, {similarity:.3f})")
+            stats.add("cache", (time.perf_counter() - start) * 1000, db_type)
+            return db_type
+
+        db_type, probability = memory.classify(question_vector)
+        if db_type:
+            st.success(f"Using learned routing classifier: {db_type} (probability: {probability:.2f})")
+            stats.add("classifier", (time.perf_counter() - start) * 1000, db_type)
+            return db_type
             
-        st.warning(f"Low confidence scores (below {confidence_threshold}), falling back to LLM routing")
+        st.warning(f"Low confidence scores (below {st.session_state.router.fanout_threshold}), falling back to LLM routing")
         
-        # Fallback to LLM routing
-        routing_agent = create_routing_agent()
-        response = routing_agent.run(question)
+        # Fallback to LLM routing, with one agent per session
+        if st.session_state.routing_agent is None:
+            st.session_state.routing_agent = create_routing_agent()
+        response = st.session_state.routing_agent.run(question)
         
         db_type = (response.content
                   .strip()
@@ -196,9 +233,14 @@ def route_query(question: str) -> Optional[DatabaseType]:
         
         if db_type in COLLECTIONS:
             st.success(f"Using LLM routing decision: {db_type}")
+            memory.record(question_vector, db_type, "llm")
+            stats.add("llm", (time.perf_counter() - start) * 1000, db_type)
             return db_type
             
         st.warning("No suitable database found, will use web search fallback")
+        # Logged too, so the classifier learns off-topic questions instead of forcing them into a database
+        memory.record(question_vector, NO_DATABASE, "llm")
+        stats.add("web", (time.perf_counter() - start) * 1000, None)
         return None
         
     except Exception as e:
@@ -211,9 +253,7 @@ def create_fallback_agent(chat_model: BaseLanguageModel):
     def web_research(query: str) -> str:
         """Web search with result formatting."""
         try:
-            search = DuckDuckGoSearchRun(num_results=5)
-            results = search.run(query)
-            return results
+            return get_web_search_client().run(query)
         except Exception as e:
             return f"Search failed: {str(e)}. Providing answer based on general knowledge."
 
@@ -333,6 +373,16 @@ def main():
             st.stop()
 
         st.markdown("---")
+        routing_stats = st.session_state.routing_stats
+        if routing_stats.events:
+            overall, recent = routing_stats.summary(), routing_stats.summary(last=50)
+            st.caption(f"🧭 Routing: {overall['questions']} questions, LLM fallback "
+                       f"{overall['llm_fallback_rate']:.0%} overall / {recent['llm_fallback_rate']:.0%} in the last 50, "
+                       f"median {recent['median_latency_ms']:.0f} ms · "
+                       f"{len(st.session_state.routing_memory)} decisions learned")
+            rolling = routing_stats.rolling_fallback_rate()
+            if len(rolling) > 1:
+                st.line_chart(rolling, height=120)
 
     st.header("Document Upload")
     st.info("Upload documents to populate the databases. Each tab corresponds to a different database.")
@@ -357,7 +407,10 @@ def main():
                     
                     if all_texts:
                         db = st.session_state.databases[collection_type]
-                        db.add_documents(all_texts)
+                        ids = db.add_documents(all_texts)
+                        # Keep the routing profile current with the vectors just stored
+                        st.session_state.router.add_points(db.client, collection_config.collection_name,
+                                                           collection_type, ids)
                         st.success("Documents processed and added to the database!")
     
     # Query section
@@ -0,0 +1,205 @@
+"""Learned routing for questions the centroid router cannot place confidently.
+
+Every confident routing decision (question embedding -> database), from the
+centroid router or from the LLM router, is appended to `decisions.jsonl`.
+When the LLM router finds no suitable database, that is logged too, under
+the `NO_DATABASE` label. Decisions are reused in two ways:
+
+1. Nearest-neighbour cache: a new question whose embedding has cosine
+   similarity >= `cache_threshold` with a logged one gets the same decision,
+   which may be `NO_DATABASE`.
+2. Classifier: a softmax regression over the logged embeddings, retrained
+   every `retrain_every` new decisions, routes the question if its top
+   probability is >= `classifier_confidence` and its nearest logged question
+   has similarity >= `min_neighbor_similarity`. Off-topic questions are far
+   from everything logged, so they are not forced into a database. A
+   `NO_DATABASE` prediction is not a route either.
+
+The LLM router is only called when neither is confident. Its answers become
+training data, so fallbacks become rarer as the app is used. Decisions made
+by the cache or the classifier are not logged, so they cannot reinforce
+their own mistakes.
+
+`RoutingStats` appends one event per routed question to `events.jsonl`, so
+the fallback rate and routing latency can be followed across sessions.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Routing methods that called the LLM router: "llm" picked a database, "web" found none
+LLM_METHODS = ("llm", "web")
+# Label of questions the LLM router found no database for
+NO_DATABASE = "none"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+class SoftmaxClassifier:
+    """Multinomial logistic regression on unit-length embeddings, trained with full-batch gradient descent."""
+
+    def __init__(self, l2: float = 1e-3, learning_rate: float = 0.5, epochs: int = 300):
+        self.l2 = l2
+        self.learning_rate = learning_rate
+        self.epochs = epochs
+        self.labels: List[str] = []
+        self.weights: Optional[np.ndarray] = None
+        self.bias: Optional[np.ndarray] = None
+
+    def fit(self, vectors: np.ndarray, labels: Sequence[str]):
+        self.labels = sorted(set(labels))
+        index = {label: i for i, label in enumerate(self.labels)}
+        targets = np.zeros((len(labels), len(self.labels)), dtype=np.float32)
+        targets[np.arange(len(labels)), [index[label] for label in labels]] = 1.0
+        weights = np.zeros((vectors.shape[1], len(self.labels)), dtype=np.float32)
+        bias = np.zeros(len(self.labels), dtype=np.float32)
+        # Unit-length inputs give small logits; scaling them up lets the model reach confident probabilities
+        inputs = vectors * 10.0
+        for _ in range(self.epochs):
+            probabilities = self._softmax(inputs @ weights + bias)
+            error = (probabilities - targets) / len(labels)
+            weights -= self.learning_rate * (inputs.T @ error + self.l2 * weights)
+            bias -= self.learning_rate * error.sum(axis=0)
+        self.weights, self.bias = weights, bias
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    def predict(self, vector: np.ndarray) -> Tuple[str, float]:
+        probabilities = self._softmax((vector * 10.0) @ self.weights + self.bias)
+        best = int(np.argmax(probabilities))
+        return self.labels[best], float(probabilities[best])
+
+
+class RoutingMemory:
+    def __init__(self, directory: str, cache_threshold: float = 0.92, classifier_confidence: float = 0.8,
+                 min_neighbor_similarity: float = 0.5, min_examples_per_class: int = 5, retrain_every: int = 10):
+        self.directory = directory
+        self.cache_threshold = cache_threshold
+        self.classifier_confidence = classifier_confidence
+        self.min_neighbor_similarity = min_neighbor_similarity
+        self.min_examples_per_class = min_examples_per_class
+        self.retrain_every = retrain_every
+        self._lock = threading.Lock()
+        self._vectors: List[np.ndarray] = []
+        self._labels: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._classifier: Optional[SoftmaxClassifier] = None
+        self._untrained = 0
+        os.makedirs(directory, exist_ok=True)
+
+        path = os.path.join(directory, "decisions.jsonl")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # A line cut short by an interrupted write
+                    self._vectors.append(_normalize(np.asarray(record["vector"])))
+                    self._labels.append(record["db"])
+        self._retrain()
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def _retrain(self):
+        counts = {label: self._labels.count(label) for label in set(self._labels)}
+        self._matrix = np.vstack(self._vectors) if self._vectors else None
+        self._untrained = 0
+        # A classifier needs at least two databases, each with a few examples
+        db_counts = [count for label, count in counts.items() if label != NO_DATABASE]
+        if len(db_counts) < 2 or min(db_counts) < self.min_examples_per_class:
+            self._classifier = None
+            return
+        # "No database" becomes a class of its own once it has as many examples
+        labels = {label for label, count in counts.items() if count >= self.min_examples_per_class}
+        rows = [i for i, label in enumerate(self._labels) if label in labels]
+        classifier = SoftmaxClassifier()
+        classifier.fit(self._matrix[rows], [self._labels[i] for i in rows])
+        self._classifier = classifier
+
+    def record(self, vector: Sequence[float], db_type: str, source: str):
+        """Log a confident routing decision, or `NO_DATABASE`, for reuse."""
+        normalized = _normalize(np.asarray(vector))
+        with self._lock:
+            with open(os.path.join(self.directory, "decisions.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"db": db_type, "source": source, "time": time.time(),
+                                    "vector": [round(float(x), 6) for x in normalized]}) + "\n")
+            self._vectors.append(normalized)
+            self._labels.append(db_type)
+            self._matrix = np.vstack([self._matrix, normalized]) if self._matrix is not None else normalized[None, :]
+            self._untrained += 1
+            if self._untrained >= self.retrain_every:
+                self._retrain()
+
+    def lookup(self, vector: Sequence[float]) -> Tuple[Optional[str], float]:
+        """Decision for the most similar logged question (a database or `NO_DATABASE`), if it is similar enough."""
+        if self._matrix is None:
+            return None, 0.0
+        similarities = self._matrix @ _normalize(np.asarray(vector))
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.cache_threshold:
+            return self._labels[best], float(similarities[best])
+        return None, float(similarities[best])
+
+    def classify(self, vector: Sequence[float]) -> Tuple[Optional[str], float]:
+        """Classifier prediction, if it is a confident database prediction for a question near logged ones."""
+        if self._classifier is None:
+            return None, 0.0
+        normalized = _normalize(np.asarray(vector))
+        db_type, probability = self._classifier.predict(normalized)
+        if db_type == NO_DATABASE or probability < self.classifier_confidence:
+            return None, probability
+        if float(np.max(self._matrix @ normalized)) < self.min_neighbor_similarity:
+            return None, probability
+        return db_type, probability
+
+
+class RoutingStats:
+    """Persistent log of how each question was routed and how long it took."""
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, "events.jsonl")
+        os.makedirs(directory, exist_ok=True)
+        self.events: List[Dict] = []
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.events.append(json.loads(line))
+                    except ValueError:
+                        continue
+
+    def add(self, method: str, latency_ms: float, db_type: Optional[str]):
+        event = {"time": time.time(), "method": method, "latency_ms": round(latency_ms, 1), "db": db_type}
+        self.events.append(event)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event) + "\n")
+
+    def summary(self, last: Optional[int] = None) -> Dict[str, float]:
+        events = self.events[-last:] if last else self.events
+        if not events:
+            return {"questions": 0, "llm_fallback_rate": 0.0, "median_latency_ms": 0.0}
+        latencies = sorted(event["latency_ms"] for event in events)
+        return {
+            "questions": len(events),
+            "llm_fallback_rate": sum(event["method"] in LLM_METHODS for event in events) / len(events),
+            "median_latency_ms": latencies[len(latencies) // 2],
+        }
+
+    def rolling_fallback_rate(self, window: int = 20) -> List[float]:
+        """LLM fallback rate over a sliding window of questions, oldest first."""
+        flags = np.array([event["method"] in LLM_METHODS for event in self.events], dtype=np.float32)
+        if len(flags) < window:
+            return [float(flags.mean())] if len(flags) else []
+        return np.convolve(flags, np.ones(window) / window, mode="valid").tolist()
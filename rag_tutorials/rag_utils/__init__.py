@@ -0,0 +1,6 @@
+"""Helpers shared by the RAG tutorials.
+
+Apps add the `rag_tutorials` directory to `sys.path` and import the module they
+need, e.g. `from rag_utils.embedding_cache import CachedEmbeddings`. Modules are
+not imported here because each one depends on a different app's requirements.
+"""
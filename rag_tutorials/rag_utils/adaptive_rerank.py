@@ -0,0 +1,182 @@
+"""Adaptive rerank budget for RAGLite hybrid search results.
+
+Reranking every hybrid candidate is the most expensive step of a search. When
+the fused (RRF) scores already show a clear winner, the reranker adds little,
+so `AdaptiveReranker` decides per query how much of the head to rerank:
+
+- margin >= skip_margin: keep the hybrid order, no reranker call
+- margin >= head_margin: rerank only the top `head_size` candidates
+- otherwise: rerank all candidates
+
+The margin is the gap between the first and second fused scores relative to
+the spread of all fused scores, so it is comparable across queries.
+
+Candidates can be reranked in batches on a thread pool, which suits local
+cross-encoders such as flashrank. A fraction of queries can also be reranked
+in full in "shadow" mode, to log how often the adaptive order differs. Shadow
+reranks run on a background thread, so they add nothing to the query's latency.
+"""
+import logging
+import random
+import threading
+import time
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from raglite import RAGLiteConfig
+from raglite._database import Chunk
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RerankPolicy:
+    skip_margin: float = 0.6
+    head_margin: float = 0.3
+    head_size: int = 3
+    # Candidates per reranker call; None sends all candidates in one call.
+    batch_size: Optional[int] = None
+    max_workers: int = 4
+    # Fraction of adaptive decisions that are also reranked in full for comparison.
+    shadow_rate: float = 0.0
+
+
+@dataclass
+class RerankDecision:
+    mode: str
+    margin: float
+    candidates: int
+    reranked: int
+    rerank_ms: float
+    estimated_saved_ms: float
+
+
+def score_margin(scores: List[float]) -> float:
+    """Gap between the top two scores, relative to the spread of all scores."""
+    if len(scores) < 2:
+        return 1.0
+    spread = scores[0] - scores[-1]
+    if spread <= 0:
+        return 0.0
+    return (scores[0] - scores[1]) / spread
+
+
+def _select_reranker(config: RAGLiteConfig):
+    # Language-specific reranker tuples fall back to their "en" entry, as the apps are English-only.
+    if isinstance(config.reranker, Sequence):
+        rerankers = dict(config.reranker)
+        return rerankers.get("en") or rerankers.get("other")
+    return config.reranker
+
+
+class AdaptiveReranker:
+    """Reranks the uncertain head of hybrid search results and tracks the latency saved."""
+
+    def __init__(self, policy: RerankPolicy = RerankPolicy()):
+        self.policy = policy
+        self.decisions = {"skip": 0, "head": 0, "full": 0}
+        self.total_saved_ms = 0.0
+        self.shadow_runs = 0
+        self.shadow_top1_changes = 0
+        self._ms_per_candidate: Optional[float] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=policy.max_workers) if policy.batch_size else None
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1) if policy.shadow_rate else None
+        self._shadow_pending = False
+
+    def _rank(self, reranker, query: str, chunks: List[Chunk]) -> List[Tuple[float, int]]:
+        """(score, index) pairs, best first. Batches run concurrently when a batch size is set."""
+        docs = [str(chunk) for chunk in chunks]
+        batch_size = self.policy.batch_size or len(docs)
+        batches = [(start, docs[start:start + batch_size]) for start in range(0, len(docs), batch_size)]
+
+        def rank_batch(batch):
+            start, batch_docs = batch
+            results = reranker.rank(query=query, docs=batch_docs)
+            return [(result.score, start + result.doc_id) for result in results.results]
+
+        if self._executor is not None and len(batches) > 1:
+            ranked = [pair for batch in self._executor.map(rank_batch, batches) for pair in batch]
+        else:
+            ranked = [pair for batch in batches for pair in rank_batch(batch)]
+        # Scores from separate batches are comparable for cross-encoders, which score pairs independently.
+        return sorted(ranked, key=lambda pair: pair[0], reverse=True)
+
+    def _timed_rank(self, reranker, query: str, chunks: List[Chunk]) -> Tuple[List[Chunk], float]:
+        start = time.perf_counter()
+        order = self._rank(reranker, query, chunks)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            per_candidate = elapsed_ms / len(chunks)
+            # Exponential moving average of the reranker's cost per candidate
+            self._ms_per_candidate = per_candidate if self._ms_per_candidate is None \
+                else 0.8 * self._ms_per_candidate + 0.2 * per_candidate
+        return [chunks[index] for _, index in order], elapsed_ms
+
+    def rerank(self, query: str, chunks: List[Chunk], scores: List[float],
+               config: RAGLiteConfig) -> Tuple[List[Chunk], RerankDecision]:
+        """Rerank `chunks` (in hybrid order, with their fused `scores`) within the adaptive budget."""
+        reranker = _select_reranker(config)
+        margin = score_margin(scores)
+        if reranker is None or not chunks:
+            return chunks, RerankDecision("skip", margin, len(chunks), 0, 0.0, 0.0)
+
+        policy = self.policy
+        if margin >= policy.skip_margin:
+            mode, head = "skip", 0
+        elif margin >= policy.head_margin and len(chunks) > policy.head_size:
+            mode, head = "head", policy.head_size
+        else:
+            mode, head = "full", len(chunks)
+
+        rerank_ms = 0.0
+        result = chunks
+        if head:
+            reranked_head, rerank_ms = self._timed_rank(reranker, query, chunks[:head])
+            result = reranked_head + chunks[head:]
+
+        estimated_saved_ms = (len(chunks) - head) * (self._ms_per_candidate or 0.0)
+        decision = RerankDecision(mode, margin, len(chunks), head, rerank_ms, estimated_saved_ms)
+        with self._lock:
+            self.decisions[mode] += 1
+            self.total_saved_ms += estimated_saved_ms
+        logger.info(f"Adaptive rerank: mode={mode} margin={margin:.2f} reranked={head}/{len(chunks)} "
+                    f"rerank={rerank_ms:.0f}ms saved~{estimated_saved_ms:.0f}ms")
+
+        if mode != "full" and random.random() < policy.shadow_rate:
+            with self._lock:
+                # At most one shadow check at a time, so a slow reranker cannot build up a backlog
+                submit = not self._shadow_pending
+                self._shadow_pending = True
+            if submit:
+                self._shadow_executor.submit(self._shadow_compare, reranker, query, list(chunks), list(result))
+        return result, decision
+
+    def _shadow_compare(self, reranker, query: str, chunks: List[Chunk], adaptive: List[Chunk]):
+        """Rerank everything and log where the adaptive order differs from the full one."""
+        try:
+            full, full_ms = self._timed_rank(reranker, query, chunks)
+        except Exception as e:
+            logger.warning(f"Adaptive rerank shadow check failed: {e}")
+            return
+        finally:
+            with self._lock:
+                self._shadow_pending = False
+        top1_changed = full[0].id != adaptive[0].id
+        k = min(5, len(chunks))
+        overlap = len({c.id for c in full[:k]} & {c.id for c in adaptive[:k]}) / k
+        with self._lock:
+            self.shadow_runs += 1
+            self.shadow_top1_changes += int(top1_changed)
+        logger.info(f"Adaptive rerank shadow check: top1_changed={top1_changed} top{k}_overlap={overlap:.2f} "
+                    f"full_rerank={full_ms:.0f}ms")
+
+    def stats(self) -> dict:
+        return {
+            **self.decisions,
+            "total_saved_ms": round(self.total_saved_ms, 1),
+            "shadow_runs": self.shadow_runs,
+            "shadow_top1_changes": self.shadow_top1_changes,
+        }
@@ -0,0 +1,84 @@
+"""Base class for LangChain embedders that batch and parallelise provider calls.
+
+Embedding a document one text per HTTP call turns a 300-page PDF into
+hundreds of serial round-trips. `BatchedEmbeddings` packs texts into requests
+that respect the provider's limits and sends them on a bounded thread pool:
+
+- Backends with a batch endpoint override `embed_batch`, so each request carries
+  up to `max_batch_size` texts and `max_batch_chars` characters.
+- Backends without one override only `embed_one`. Texts are then sent one per
+  request, `max_concurrency` at a time.
+- A batch rejected as too large is split in half and retried, so
+  conservative defaults tighten themselves instead of failing the upload.
+  Rate-limit errors are raised as they are, since splitting would only send more requests.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+# Payload or size errors only; splitting a batch never helps with rate limiting
+_LIMIT_ERROR = re.compile(r"too (large|long|many)|payload|413|request size|maximum (batch|input|context)",
+                          re.IGNORECASE)
+_RATE_LIMIT_ERROR = re.compile(r"rate.?limit|429|too many requests|quota", re.IGNORECASE)
+
+
+class BatchedEmbeddings(Embeddings):
+    max_batch_size: int = 64
+    max_batch_chars: Optional[int] = None
+    max_concurrency: int = 4
+
+    def embed_one(self, text: str) -> List[float]:
+        """Embed a single text with one provider call."""
+        raise NotImplementedError
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts in one provider call. Override when the backend supports it."""
+        raise NotImplementedError
+
+    @property
+    def supports_batch(self) -> bool:
+        return type(self).embed_batch is not BatchedEmbeddings.embed_batch
+
+    def plan_batches(self, texts: List[str]) -> List[List[str]]:
+        """Greedily pack texts, in order, into batches under the size limits."""
+        if not self.supports_batch:
+            return [[text] for text in texts]
+        batches, current, current_chars = [], [], 0
+        for text in texts:
+            too_many = len(current) >= self.max_batch_size
+            too_long = self.max_batch_chars is not None and current_chars + len(text) > self.max_batch_chars
+            if current and (too_many or too_long):
+                batches.append(current)
+                current, current_chars = [], 0
+            current.append(text)
+            current_chars += len(text)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_planned(self, batch: List[str]) -> List[List[float]]:
+        if not self.supports_batch:
+            return [self.embed_one(batch[0])]
+        try:
+            return self.embed_batch(batch)
+        except Exception as e:
+            message = str(e)
+            if len(batch) == 1 or not _LIMIT_ERROR.search(message) or _RATE_LIMIT_ERROR.search(message):
+                raise
+            middle = len(batch) // 2
+            return self._embed_planned(batch[:middle]) + self._embed_planned(batch[middle:])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = self.plan_batches(texts)
+        if len(batches) <= 1 or self.max_concurrency <= 1:
+            return [vector for batch in batches for vector in self._embed_planned(batch)]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            # map keeps batch order, so vectors line up with the input texts
+            return [vector for vectors in executor.map(self._embed_planned, batches) for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.supports_batch:
+            return self.embed_batch([text])[0]
+        return self.embed_one(text)
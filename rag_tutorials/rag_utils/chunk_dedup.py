@@ -0,0 +1,226 @@
+"""Exact and near-duplicate chunk elimination before embedding.
+
+Overlapping uploads (the same paper twice, a PDF and its web version, repeated
+boilerplate pages) produce chunks that are identical or nearly so. Each one
+costs an embedding call and later crowds the retrieved contexts. The
+deduplicator drops them in two stages:
+
+1. Exact: SHA-256 of the whitespace- and case-normalised text.
+2. Near: either MinHash over word shingles, with LSH banding (estimated Jaccard
+   similarity >= `jaccard_threshold`), or a 64-bit SimHash (Hamming distance
+   <= `simhash_max_distance`).
+
+`ChunkDeduplicator` keeps its signatures between calls, so chunks are also
+checked against everything indexed earlier in the session. Only the active
+method's signatures are computed. The kept texts are remembered too, so
+switching `near_method` later signs the earlier chunks once, on first use. When indexing can
+fail, filter with `remember=False` and call `remember` once the kept chunks
+are stored, so a failed upload can be retried.
+"""
+import hashlib
+import math
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+NEAR_METHODS = ("minhash", "simhash", "none")
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# SimHash is split into this many blocks: two hashes within `blocks - 1` bits share at least one block exactly.
+_SIMHASH_BLOCKS = 8
+
+
+@dataclass(frozen=True)
+class DedupConfig:
+    near_method: str = "minhash"
+    jaccard_threshold: float = 0.85
+    simhash_max_distance: int = 3
+    shingle_size: int = 5
+    num_perm: int = 128
+    bands: int = 32
+    seed: int = 1
+
+
+@dataclass
+class DedupReport:
+    total: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+
+    @property
+    def removed(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+    @property
+    def kept(self) -> int:
+        return self.total - self.removed
+
+    def requests_saved(self, batch_size: int = 1) -> int:
+        """Embedding requests avoided, for an embedder sending `batch_size` texts per request."""
+        return math.ceil(self.total / batch_size) - math.ceil(self.kept / batch_size)
+
+    def add(self, other: "DedupReport"):
+        self.total += other.total
+        self.exact_duplicates += other.exact_duplicates
+        self.near_duplicates += other.near_duplicates
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _shingle_hashes(text: str, size: int) -> np.ndarray:
+    words = re.findall(r"\w+", text.lower())
+    shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little") for s in shingles],
+        dtype=np.uint64,
+    )
+
+
+def _simhash(text: str) -> int:
+    weights: Dict[str, int] = defaultdict(int)
+    for token in re.findall(r"\w+", text.lower()):
+        weights[token] += 1
+    totals = [0] * 64
+    for token, weight in weights.items():
+        value = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+        for bit in range(64):
+            totals[bit] += weight if value >> bit & 1 else -weight
+    return sum(1 << bit for bit in range(64) if totals[bit] > 0)
+
+
+class ChunkDeduplicator:
+    """Filters exact and near-duplicate chunks, remembering everything it has kept."""
+
+    def __init__(self, config: DedupConfig = DedupConfig()):
+        if config.num_perm % config.bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.config = config
+        self.totals = DedupReport()
+        self._exact: Set[str] = set()
+        self._texts: List[str] = []
+        self._minhashes: List[np.ndarray] = []
+        self._lsh: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+        self._simhashes: List[int] = []
+        self._simhash_blocks: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        rng = np.random.RandomState(config.seed)
+        self._perm_a = rng.randint(1, np.iinfo(np.int64).max, size=config.num_perm, dtype=np.int64).astype(np.uint64)
+        self._perm_b = rng.randint(0, np.iinfo(np.int64).max, size=config.num_perm, dtype=np.int64).astype(np.uint64)
+
+    def _minhash(self, text: str) -> np.ndarray:
+        hashes = _shingle_hashes(text, self.config.shingle_size)
+        # Universal hashing (a*x + b) mod p, one row per permutation; uint64 overflow is intended
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(self._perm_a, hashes) + self._perm_b[:, None]) % _MERSENNE_PRIME
+        return np.bitwise_and(permuted, _MAX_HASH).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        rows = self.config.num_perm // self.config.bands
+        return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.config.bands)]
+
+    def _is_near_minhash(self, signature: np.ndarray, keys) -> bool:
+        candidates = {index for key in keys for index in self._lsh.get(key, ())}
+        return any(
+            np.mean(self._minhashes[index] == signature) >= self.config.jaccard_threshold
+            for index in candidates
+        )
+
+    def _simhash_keys(self, value: int) -> List[Tuple[int, int]]:
+        width = 64 // _SIMHASH_BLOCKS
+        return [(block, value >> (block * width) & ((1 << width) - 1)) for block in range(_SIMHASH_BLOCKS)]
+
+    def _is_near_simhash(self, value: int, keys) -> bool:
+        candidates = {index for key in keys for index in self._simhash_blocks.get(key, ())}
+        return any(bin(self._simhashes[index] ^ value).count("1") <= self.config.simhash_max_distance
+                   for index in candidates)
+
+    def _add_minhash(self, signature: np.ndarray, keys):
+        self._minhashes.append(signature)
+        for key in keys:
+            self._lsh[key].append(len(self._minhashes) - 1)
+
+    def _add_simhash(self, value: int, keys):
+        self._simhashes.append(value)
+        for key in keys:
+            self._simhash_blocks[key].append(len(self._simhashes) - 1)
+
+    def _catch_up(self, method: str):
+        """Sign the kept chunks remembered while another method was active."""
+        if method == "minhash":
+            for text in self._texts[len(self._minhashes):]:
+                signature = self._minhash(text)
+                self._add_minhash(signature, self._band_keys(signature))
+        elif method == "simhash":
+            for text in self._texts[len(self._simhashes):]:
+                value = _simhash(text)
+                self._add_simhash(value, self._simhash_keys(value))
+
+    def check(self, text: str, remember: bool = True) -> Optional[str]:
+        """Return "exact" or "near" if `text` duplicates a kept chunk, else None (and remember it)."""
+        digest = hashlib.sha256(_normalize(text).encode()).hexdigest()
+        if digest in self._exact:
+            return "exact"
+
+        method = self.config.near_method
+        self._catch_up(method)
+        if method == "minhash":
+            signature = self._minhash(text)
+            keys = self._band_keys(signature)
+            if self._is_near_minhash(signature, keys):
+                return "near"
+        elif method == "simhash":
+            value = _simhash(text)
+            keys = self._simhash_keys(value)
+            if self._is_near_simhash(value, keys):
+                return "near"
+
+        if remember:
+            self._exact.add(digest)
+            self._texts.append(text)
+            if method == "minhash":
+                self._add_minhash(signature, keys)
+            elif method == "simhash":
+                self._add_simhash(value, keys)
+        return None
+
+    def filter(self, documents: List[Document], remember: bool = True) -> Tuple[List[Document], DedupReport]:
+        """Drop documents whose text duplicates an earlier one, in this batch or a previous one.
+
+        With `remember=False` nothing is recorded: pass the kept documents and the report to
+        `remember` once they are indexed.
+        """
+        report = DedupReport(total=len(documents))
+        # Duplicates within the batch are still caught when the session's signatures are left untouched
+        batch = self if remember else ChunkDeduplicator(self.config)
+        kept = []
+        for doc in documents:
+            duplicate = self.check(doc.page_content, remember=remember)
+            if duplicate is None and not remember:
+                duplicate = batch.check(doc.page_content)
+            if duplicate == "exact":
+                report.exact_duplicates += 1
+            elif duplicate == "near":
+                report.near_duplicates += 1
+            else:
+                kept.append(doc)
+        if remember:
+            self.totals.add(report)
+        return kept, report
+
+    def remember(self, documents: List[Document], report: Optional[DedupReport] = None):
+        """Record documents kept by `filter(..., remember=False)` after they were indexed."""
+        for doc in documents:
+            self.check(doc.page_content)
+        if report is not None:
+            self.totals.add(report)
+
+
+def drop_redundant(documents: List[Document], config: DedupConfig = DedupConfig()) -> List[Document]:
+    """Remove duplicates from a single list, e.g. retrieved contexts, keeping the first (best ranked)."""
+    return ChunkDeduplicator(config).filter(documents)[0]
@@ -0,0 +1,131 @@
+"""Persistent, content-addressed cache for LangChain embedding models.
+
+`CachedEmbeddings` wraps any `langchain_core.embeddings.Embeddings` and stores
+every vector in a local SQLite file, keyed on the model name plus a hash of
+the text. Re-embedding text that has been seen before - by any app using the
+same model - costs no API calls.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "RAG_EMBEDDING_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "rag_tutorials", "embeddings.sqlite"),
+)
+
+# SQLite's default limit on host parameters is 999 in older builds
+_LOOKUP_BATCH = 500
+
+_DTYPES = {"float16": np.float16, "float32": np.float32}
+
+
+def _model_name(embeddings: Embeddings) -> str:
+    model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None)
+    return f"{type(embeddings).__name__}:{model}" if model else type(embeddings).__name__
+
+
+class CachedEmbeddings(Embeddings):
+    """Drop-in `Embeddings` that serves repeated texts from an on-disk cache.
+
+    Args:
+        embeddings: The embedding model to wrap.
+        model_name: Cache namespace. Defaults to the wrapped class and its `model`.
+        path: SQLite file to use. Defaults to `$RAG_EMBEDDING_CACHE` or
+            `~/.cache/rag_tutorials/embeddings.sqlite`.
+        dtype: Storage precision, "float32" or "float16" (half the disk). With
+            float16, freshly embedded vectors are rounded too, so a text gets
+            the same vector whether or not it was cached.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: Optional[str] = None,
+                 path: str = DEFAULT_CACHE_PATH, dtype: str = "float32"):
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported dtype: {dtype}. Use one of {list(_DTYPES)}")
+        self.embeddings = embeddings
+        self.model_name = model_name or _model_name(embeddings)
+        self.path = path
+        self.dtype = dtype
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _key(self, text: str, kind: str) -> str:
+        # Query and document embeddings differ for some providers (e.g. Cohere input_type)
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{kind}:{digest}"
+
+    def _lookup(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[i:i + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, dtype, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=_DTYPES[dtype]).astype(np.float32).tolist()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> Dict[str, List[float]]:
+        """Store vectors and return them as a later lookup will, i.e. at storage precision."""
+        arrays = {key: np.asarray(vector, dtype=_DTYPES[self.dtype]) for key, vector in items.items()}
+        rows = [(key, self.dtype, array.tobytes()) for key, array in arrays.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+        return {key: array.astype(np.float32).tolist() for key, array in arrays.items()}
+
+    def _embed(self, texts: List[str], kind: str, embed_fn) -> List[List[float]]:
+        keys = [self._key(text, kind) for text in texts]
+        cached = self._lookup(list(dict.fromkeys(keys)))
+
+        # Embed each missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            cached.update(self._store(dict(zip(missing.keys(), vectors))))
+
+        # The instance is shared across threads (e.g. batches embedded from a thread pool)
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "doc", self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query", lambda batch: [self.embeddings.embed_query(batch[0])])[0]
+
+    @property
+    def hit_rate(self) -> float:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {"model": self.model_name, "hits": hits, "misses": misses,
+                "hit_rate": round(hits / total if total else 0.0, 3)}
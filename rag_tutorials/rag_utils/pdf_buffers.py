@@ -0,0 +1,77 @@
+"""Load PDFs from in-memory buffers instead of temporary files.
+
+Streamlit uploads already hold the whole file in memory. Writing them to disk
+only so that a path-based loader can read them back doubles memory use and
+adds disk I/O on every upload. pypdf reads from any seekable stream, so the
+upload (or its bytes/bytearray/memoryview) is parsed directly, without a copy.
+"""
+import io
+from typing import BinaryIO, List, Union
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+PdfBuffer = Union[bytes, bytearray, memoryview, BinaryIO]
+
+
+class _MemoryViewStream(io.RawIOBase):
+    """Read-only seekable stream over a bytearray or memoryview, without copying it.
+
+    io.BytesIO only shares the memory of immutable bytes; any other buffer is copied.
+    """
+
+    def __init__(self, buffer: Union[bytearray, memoryview]):
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._position + size)
+        data = self._view[self._position:end].tobytes() if end > self._position else b""
+        self._position = max(self._position, end)
+        return data
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def _as_stream(buffer: PdfBuffer) -> BinaryIO:
+    if isinstance(buffer, bytes):
+        # BytesIO shares the memory of immutable bytes instead of copying it
+        return io.BytesIO(buffer)
+    if isinstance(buffer, (bytearray, memoryview)):
+        return _MemoryViewStream(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def pdf_page_texts(buffer: PdfBuffer) -> List[str]:
+    """Extract the text of every page of an in-memory PDF."""
+    reader = PdfReader(_as_stream(buffer))
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def load_pdf_documents(buffer: PdfBuffer, source: str) -> List[Document]:
+    """One LangChain Document per page, with the same metadata as PyPDFLoader."""
+    return [
+        Document(page_content=text, metadata={"source": source, "page": page})
+        for page, text in enumerate(pdf_page_texts(buffer))
+    ]
@@ -0,0 +1,100 @@
+"""Qdrant collection profiles for the local RAG agents.
+
+- "default": float32 vectors, payloads and HNSW graph in RAM. Fastest, but
+  every 1024-d chunk costs 4 KB of RAM before the graph.
+- "large_corpus_scalar": int8 scalar quantization (4x smaller) kept in RAM
+  for the HNSW traversal, with original vectors and payloads on disk.
+  Candidates are oversampled and rescored against the originals.
+- "large_corpus_binary": 1-bit binary quantization (32x smaller), the same
+  layout. Best with high-dimensional embeddings (>= 1024), and needs more
+  oversampling for the same recall.
+
+Each profile gets its own collection name, so switching profiles never mixes
+vectors indexed under different settings.
+"""
+from dataclasses import dataclass, field
+from typing import Optional
+
+from qdrant_client import QdrantClient, models
+
+PROFILES = ("default", "large_corpus_scalar", "large_corpus_binary")
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    name: str
+    on_disk: bool = False
+    quantization: Optional[str] = None  # "scalar", "binary" or None
+    oversampling: float = 1.0
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    hnsw_ef: int = 64
+    collection_suffix: str = ""
+    description: str = field(default="", compare=False)
+
+    def collection_name(self, base: str) -> str:
+        return base + self.collection_suffix
+
+    def create_kwargs(self, size: int, distance: models.Distance = models.Distance.COSINE) -> dict:
+        """Keyword arguments for QdrantClient.create_collection."""
+        kwargs = dict(
+            vectors_config=models.VectorParams(size=size, distance=distance, on_disk=self.on_disk),
+            hnsw_config=models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct),
+            on_disk_payload=self.on_disk,
+        )
+        if self.quantization == "scalar":
+            kwargs["quantization_config"] = models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        elif self.quantization == "binary":
+            kwargs["quantization_config"] = models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=True)
+            )
+        return kwargs
+
+    def search_params(self) -> models.SearchParams:
+        """Search parameters to pass with every query against this profile's collection."""
+        quantization = None
+        if self.quantization:
+            quantization = models.QuantizationSearchParams(rescore=True, oversampling=self.oversampling)
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+
+COLLECTION_PROFILES = {
+    "default": CollectionProfile(
+        name="default",
+        description="Full-precision vectors in RAM (small corpora)",
+    ),
+    "large_corpus_scalar": CollectionProfile(
+        name="large_corpus_scalar",
+        on_disk=True,
+        quantization="scalar",
+        oversampling=2.0,
+        # A denser graph and wider search make up for the approximate int8 distances
+        hnsw_m=32,
+        hnsw_ef_construct=200,
+        hnsw_ef=128,
+        collection_suffix="-large-sq",
+        description="int8 vectors in RAM, originals and payloads on disk",
+    ),
+    "large_corpus_binary": CollectionProfile(
+        name="large_corpus_binary",
+        on_disk=True,
+        quantization="binary",
+        oversampling=3.0,
+        hnsw_m=32,
+        hnsw_ef_construct=200,
+        hnsw_ef=128,
+        collection_suffix="-large-bq",
+        description="1-bit vectors in RAM, originals and payloads on disk",
+    ),
+}
+
+
+def ensure_collection(client: QdrantClient, base_name: str, size: int, profile: CollectionProfile) -> tuple:
+    """Create the profile's collection if it is missing. Returns (collection_name, created)."""
+    name = profile.collection_name(base_name)
+    if client.collection_exists(name):
+        return name, False
+    client.create_collection(collection_name=name, **profile.create_kwargs(size))
+    return name, True
@@ -0,0 +1,305 @@
+"""Parallel multi-document ingestion for RAGLite (raglite==0.2.1).
+
+`raglite.insert_document` converts, splits, embeds and writes one document at
+a time, and rebuilds the SQLite vector index after every document. This
+pipeline splits that work into stages:
+
+1. Parse: PDF → Markdown → sentences, in a process pool (one task per document).
+2. Embed: API embedders get one batched stream of sentence windows and chunks
+   across all documents; llama-cpp (late chunking) embeds per document.
+3. Write: a single writer session inserts documents, chunks and embeddings.
+4. Index: the SQLite ANN index is updated once for the whole batch.
+
+Documents can be given as file paths or as in-memory `DocumentSource`s, such
+as Streamlit uploads. In-memory PDFs are parsed straight from their bytes and
+never written to disk.
+
+It relies on RAGLite internals, so keep the raglite version pinned.
+"""
+import dataclasses
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import mdformat
+import numpy as np
+from pdftext.extraction import dictionary_output
+from raglite import RAGLiteConfig
+from raglite._database import Chunk, ChunkEmbedding, Document, IndexMetadata, create_database_engine, hash_bytes
+from raglite._embed import embed_sentences, sentence_embedding_type
+from raglite._markdown import document_to_markdown, parsed_pdf_to_markdown
+from raglite._split_chunks import split_chunks
+from raglite._split_sentences import split_sentences
+from sqlalchemy.engine import make_url
+from sqlmodel import Session, select
+
+STAGES = ("Parsing", "Embedding", "Writing", "Indexing")
+
+# Weight of the sentence embedding versus the full-chunk embedding, as in RAGLite.
+_ALPHA = 0.382
+
+ProgressCallback = Callable[[str, int, int], None]
+
+
+@dataclass(frozen=True)
+class DocumentSource:
+    """A document held in memory, e.g. the bytes of an uploaded file."""
+    name: str
+    data: bytes
+
+
+Source = Union[str, DocumentSource]
+
+
+@dataclass
+class IngestReport:
+    inserted: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    num_chunks: int = 0
+
+
+@dataclass
+class _ParsedDocument:
+    source: Source
+    sentences: List[str]
+    sentence_embeddings: Optional[np.ndarray] = None
+    chunks: List[Chunk] = field(default_factory=list)
+    chunk_embeddings: List[List[ChunkEmbedding]] = field(default_factory=list)
+
+
+def _source_key(source: Source) -> str:
+    """The name a source is reported under: its path, or its name if it is in memory."""
+    return source.name if isinstance(source, DocumentSource) else source
+
+
+def _document_record(source: Source) -> Document:
+    if isinstance(source, DocumentSource):
+        # Same content hash as Document.from_path, so in-memory and on-disk copies are deduplicated
+        return Document(id=hash_bytes(source.data), filename=source.name, metadata_={"size": len(source.data)})
+    return Document.from_path(Path(source))
+
+
+def _source_to_markdown(source: Source) -> str:
+    if not isinstance(source, DocumentSource):
+        return document_to_markdown(Path(source))
+    if Path(source.name).suffix.lower() == ".pdf":
+        # pdftext hands its input to pypdfium2, which reads PDFs from bytes directly
+        pages = dictionary_output(source.data, sort=True, keep_chars=False)
+        return mdformat.text("\n\n".join(parsed_pdf_to_markdown(pages)))
+    # Other formats go through pandoc, which needs a file path
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = Path(temp_dir) / source.name
+        temp_path.write_bytes(source.data)
+        return document_to_markdown(temp_path)
+
+
+def _parse_document(source: Source, max_len: int) -> List[str]:
+    """Worker: convert a document to Markdown and split it into sentences."""
+    return split_sentences(_source_to_markdown(source), max_len=max_len)
+
+
+def _sentence_windows(sentences: List[str], window_size: int) -> List[str]:
+    return [
+        "".join(sentences[max(0, i - (window_size - 1)): i + 1])
+        for i in range(len(sentences))
+    ]
+
+
+def _chunk_records(document_id: str, chunks: List[str]) -> List[Chunk]:
+    records, headings = [], ""
+    for i, chunk in enumerate(chunks):
+        record = Chunk.from_body(document_id=document_id, index=i, body=chunk, headings=headings)
+        records.append(record)
+        headings = record.extract_headings()
+    return records
+
+
+def _embed_windowing(parsed: List[_ParsedDocument], document_ids: Dict[str, str],
+                     config: RAGLiteConfig, report_progress: ProgressCallback):
+    """Embed sentence windows and full chunks of all documents in shared batches."""
+    # Windows are built here, so the embedder must not window them again.
+    flat_config = dataclasses.replace(config, embedder_sentence_window_size=1)
+
+    windows = [_sentence_windows(doc.sentences, config.embedder_sentence_window_size) for doc in parsed]
+    all_embeddings = embed_sentences([w for doc_windows in windows for w in doc_windows], config=flat_config)
+    offsets = np.cumsum([0] + [len(doc_windows) for doc_windows in windows])
+    for doc, start, end in zip(parsed, offsets[:-1], offsets[1:]):
+        doc.sentence_embeddings = all_embeddings[start:end]
+    report_progress("Embedding", 1, 2)
+
+    split = []
+    for doc in parsed:
+        chunks, chunk_embeddings = split_chunks(
+            sentences=doc.sentences,
+            sentence_embeddings=doc.sentence_embeddings,
+            sentence_window_size=config.embedder_sentence_window_size,
+            max_size=config.chunk_max_size,
+        )
+        doc.chunks = _chunk_records(document_ids[_source_key(doc.source)], chunks)
+        split.append((chunks, chunk_embeddings))
+
+    full_chunk_embeddings = embed_sentences(
+        [str(chunk) for chunks, _ in split for chunk in chunks], config=flat_config
+    )
+    position = 0
+    for doc, (chunks, chunk_embeddings) in zip(parsed, split):
+        for record, sentence_matrix in zip(doc.chunks, chunk_embeddings):
+            full = full_chunk_embeddings[position]
+            position += 1
+            doc.chunk_embeddings.append([
+                ChunkEmbedding(chunk_id=record.id, embedding=_ALPHA * sentence + (1 - _ALPHA) * full)
+                for sentence in sentence_matrix
+            ])
+    report_progress("Embedding", 2, 2)
+
+
+def _embed_late_chunking(parsed: List[_ParsedDocument], document_ids: Dict[str, str],
+                         config: RAGLiteConfig, report_progress: ProgressCallback):
+    """Late chunking needs each document's full context, so embed document by document."""
+    for i, doc in enumerate(parsed):
+        sentence_embeddings = embed_sentences(doc.sentences, config=config)
+        chunks, chunk_embeddings = split_chunks(
+            sentences=doc.sentences,
+            sentence_embeddings=sentence_embeddings,
+            sentence_window_size=config.embedder_sentence_window_size,
+            max_size=config.chunk_max_size,
+        )
+        doc.chunks = _chunk_records(document_ids[_source_key(doc.source)], chunks)
+        doc.chunk_embeddings = [
+            [ChunkEmbedding(chunk_id=record.id, embedding=sentence) for sentence in sentence_matrix]
+            for record, sentence_matrix in zip(doc.chunks, chunk_embeddings)
+        ]
+        report_progress("Embedding", i + 1, len(parsed))
+
+
+def _update_sqlite_index(engine, config: RAGLiteConfig):
+    """Add all unindexed chunks to the NNDescent index in one update."""
+    from pynndescent import NNDescent
+
+    with Session(engine) as session:
+        index_metadata = session.get(IndexMetadata, "default") or IndexMetadata(id="default")
+        chunk_ids = index_metadata.metadata_.get("chunk_ids", [])
+        chunk_sizes = index_metadata.metadata_.get("chunk_sizes", [])
+        unindexed_chunks = list(session.exec(select(Chunk).offset(len(chunk_ids))).all())
+        if not unindexed_chunks:
+            return
+        unindexed_embeddings = [chunk.embedding_matrix for chunk in unindexed_chunks]
+        X = np.vstack(unindexed_embeddings)
+        if len(chunk_ids) == 0:
+            nndescent = NNDescent(X, metric=config.vector_search_index_metric)
+        else:
+            nndescent = index_metadata.metadata_["index"]
+            nndescent.update(X)
+        nndescent.prepare()
+        index_metadata.metadata_ = {
+            **index_metadata.metadata_,
+            "index": nndescent,
+            "chunk_ids": chunk_ids + [chunk.id for chunk in unindexed_chunks],
+            "chunk_sizes": chunk_sizes + [len(em) for em in unindexed_embeddings],
+        }
+        session.add(index_metadata)
+        session.commit()
+
+
+def ingest_documents(sources: List[Source], *, config: RAGLiteConfig, max_workers: Optional[int] = None,
+                     on_progress: Optional[ProgressCallback] = None) -> IngestReport:
+    """Insert many documents into the RAGLite database.
+
+    Args:
+        sources: File paths or in-memory DocumentSources to ingest. The file name is
+            stored as the document name, and reports refer to sources by path or name.
+        config: The RAGLite configuration of the target database.
+        max_workers: Parser processes. Defaults to the number of CPU cores.
+        on_progress: Called as on_progress(stage, done, total) for each stage in STAGES.
+
+    Returns:
+        IngestReport: Inserted, skipped (already in the database) and failed documents,
+        plus wall time per stage.
+    """
+    report = IngestReport()
+    report_progress = on_progress or (lambda stage, done, total: None)
+    engine = create_database_engine(config)
+
+    # Documents are content-addressed, so unchanged files can be skipped before any work.
+    document_ids, pending = {}, []
+    with Session(engine) as session:
+        for source in sources:
+            key = _source_key(source)
+            document_id = _document_record(source).id
+            has_chunks = session.exec(select(Chunk.id).where(Chunk.document_id == document_id).limit(1)).first()
+            if has_chunks:
+                report.skipped.append(key)
+            elif key in document_ids:
+                # Sources are tracked by name, so a different file under a name already in this batch
+                # cannot be ingested alongside it. Identical files are simply ingested once.
+                if document_ids[key] != document_id:
+                    report.failed[key] = "Another file with the same name but different content is in this batch"
+            else:
+                document_ids[key] = document_id
+                pending.append(source)
+    order = {_source_key(source): i for i, source in enumerate(pending)}
+
+    start = time.perf_counter()
+    parsed = []
+    if pending:
+        workers = min(max_workers or os.cpu_count() or 1, len(pending))
+        # Spawn rather than fork: the parent may hold llama-cpp threads and DB connections.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = {executor.submit(_parse_document, source, config.chunk_max_size): source for source in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                source = futures[future]
+                try:
+                    parsed.append(_ParsedDocument(source=source, sentences=future.result()))
+                except Exception as e:
+                    report.failed[_source_key(source)] = str(e)
+                report_progress("Parsing", done, len(pending))
+    # Keep the upload order for the writer
+    parsed = [doc for doc in sorted(parsed, key=lambda doc: order[_source_key(doc.source)]) if doc.sentences]
+    report.stage_seconds["Parsing"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if parsed:
+        try:
+            if sentence_embedding_type(config=config) == "late_chunking":
+                _embed_late_chunking(parsed, document_ids, config, report_progress)
+            else:
+                _embed_windowing(parsed, document_ids, config, report_progress)
+        except Exception as e:
+            for doc in parsed:
+                report.failed[_source_key(doc.source)] = f"Embedding failed: {e}"
+            parsed = []
+    report.stage_seconds["Embedding"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    written = set()
+    with Session(engine) as session:
+        for i, doc in enumerate(parsed):
+            document_record = _document_record(doc.source)
+            if session.get(Document, document_record.id) is None:
+                session.add(document_record)
+            for record, embeddings in zip(doc.chunks, doc.chunk_embeddings):
+                if record.id in written or session.get(Chunk, record.id) is not None:
+                    continue
+                written.add(record.id)
+                session.add(record)
+                session.add_all(embeddings)
+                report.num_chunks += 1
+            session.commit()
+            report.inserted.append(_source_key(doc.source))
+            report_progress("Writing", i + 1, len(parsed))
+    report.stage_seconds["Writing"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if parsed and make_url(config.db_url).get_backend_name() == "sqlite":
+        _update_sqlite_index(engine, config)
+    report_progress("Indexing", 1, 1)
+    report.stage_seconds["Indexing"] = time.perf_counter() - start
+
+    return report
@@ -0,0 +1,106 @@
+"""Bounded LRU cache for RAGLite search + rerank results.
+
+Entries are keyed on a normalised form of the query (case, punctuation and
+whitespace folded), the database index version and the search/reranker
+configuration. The index version is the number of chunks in the database,
+so any insert - from this app or another process - makes older entries
+unreachable without explicit invalidation.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from raglite import RAGLiteConfig
+from raglite._database import Chunk, create_database_engine
+from sqlmodel import Session, func, select
+
+
+def normalize_query(query: str) -> str:
+    """Fold case, punctuation and whitespace, keeping word order.
+
+    "What is RAG?" and "what is  rag" share a key. "Is X better than Y" and
+    "is Y better than X" do not, since word order can change the meaning.
+    """
+    return " ".join(re.findall(r"\w+", query.casefold())) or query.strip().casefold()
+
+
+def index_version(config: RAGLiteConfig) -> int:
+    """Number of chunks in the database; changes whenever documents are inserted."""
+    engine = create_database_engine(config)
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(Chunk)).one()
+
+
+def reranker_signature(config: RAGLiteConfig) -> str:
+    """A stable description of the configured reranker(s)."""
+    rerankers = config.reranker if isinstance(config.reranker, tuple) else (("", config.reranker),)
+    parts = []
+    for lang, reranker in rerankers:
+        if reranker is None:
+            parts.append("none")
+            continue
+        model = getattr(reranker, "model_name", None) or getattr(reranker, "model", None) or ""
+        parts.append(f"{lang}:{type(reranker).__name__}:{model}")
+    return "|".join(parts)
+
+
+class SearchResultCache:
+    """LRU cache with hit/miss/invalidation counters."""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+
+    def key(self, query: str, config: RAGLiteConfig, **search_params) -> Tuple:
+        return (
+            normalize_query(query),
+            str(config.db_url),
+            config.embedder,
+            reranker_signature(config),
+            tuple(sorted(search_params.items())),
+        )
+
+    def get_or_compute(self, key: Hashable, version: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if version != self._version:
+                # The index changed: every cached result may now be stale.
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
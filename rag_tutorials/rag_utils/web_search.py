@@ -0,0 +1,140 @@
+"""Rate-limited, cached and coalesced DuckDuckGo search for web fallbacks.
+
+Every app in the process shares one `WebSearchClient` (see
+`get_web_search_client`), so:
+
+- A token bucket holds searches to DuckDuckGo's budget across all sessions.
+  A search waits only when the bucket is empty, instead of sleeping a fixed
+  delay before every request.
+- Results are cached per normalised query for `ttl_seconds`.
+- Concurrent identical searches are coalesced: one request is sent, and the
+  other callers wait for its result.
+- Searches rejected with a rate-limit error are retried with backoff.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a token, waiting only if none is available. Returns the time waited, in seconds."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # A negative balance reserves a future token, so concurrent callers queue up fairly
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    message = str(error).lower()
+    return "ratelimit" in message or "rate limit" in message
+
+
+class WebSearchClient:
+    def __init__(self, search: Optional[Callable[[str], str]] = None, rate: float = 0.5, burst: int = 3,
+                 ttl_seconds: float = 900, max_entries: int = 512, max_retries: int = 2):
+        if search is None:
+            from langchain_community.tools import DuckDuckGoSearchRun
+            search = DuckDuckGoSearchRun(num_results=5).run
+        self._search = search
+        self.bucket = TokenBucket(rate, burst)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_retries = max_retries
+        self._cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"searches": 0, "cache_hits": 0, "coalesced": 0, "requests": 0, "rate_limited": 0,
+                       "throttled_seconds": 0.0}
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def run(self, query: str) -> str:
+        """Search, from the cache or an in-flight identical search if possible."""
+        key = self._key(query)
+        with self._lock:
+            self._stats["searches"] += 1
+            cached = self._cache.get(key)
+            if cached and time.monotonic() - cached[0] < self.ttl_seconds:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                return cached[1]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                owner = False
+            else:
+                future = self._in_flight[key] = Future()
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._fetch(query)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            with self._lock:
+                self._cache[key] = (time.monotonic(), result)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _fetch(self, query: str) -> str:
+        for attempt in range(self.max_retries + 1):
+            waited = self.bucket.acquire()
+            with self._lock:
+                self._stats["requests"] += 1
+                self._stats["throttled_seconds"] += waited
+            try:
+                return self._search(query)
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self._stats["rate_limited"] += 1
+                time.sleep(2 ** (attempt + 2))  # 4s, 8s: DuckDuckGo's rate limits clear slowly
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "throttled_seconds": round(self._stats["throttled_seconds"], 1),
+                    "cached_queries": len(self._cache)}
+
+
+_shared_client: Optional[WebSearchClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_web_search_client() -> WebSearchClient:
+    """The process-wide client, so every session and app shares one budget and cache."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = WebSearchClient()
+        return _shared_client
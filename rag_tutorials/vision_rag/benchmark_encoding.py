@@ -0,0 +1,151 @@
+"""Compare image encodings for Vision RAG on payload size and latency.
+
+For each encoding, every input image is resized and encoded once (as the app
+does) and the benchmark reports:
+
+- payload_kb: mean size of the base64 data URI sent per image
+- encode_ms: p50 time to resize and encode one image
+- embed_ms: p50/p95 end-to-end time (encode + Embed-4 request) per image,
+  when a Cohere API key is available
+- answer_ms: p50 end-to-end time (encode + Gemini request) for one question
+  about one image, when a Google API key is available
+
+"original" reproduces the previous behaviour: resize, then re-save in the
+source format (PNG for PDF pages).
+
+Usage:
+    python benchmark_encoding.py --images img/*.png --pdf report.pdf
+    COHERE_API_KEY=... GOOGLE_API_KEY=... python benchmark_encoding.py --images img/*.png --api-samples 5
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from image_codec import EncodeConfig, EncodedImage, encode_pil, fit_size
+
+ENCODINGS = {
+    "original": None,
+    "png": EncodeConfig(format="PNG"),
+    "jpeg-q85": EncodeConfig(format="JPEG", quality=85),
+    "jpeg-q70": EncodeConfig(format="JPEG", quality=70),
+    "webp-q80": EncodeConfig(format="WEBP", quality=80),
+}
+
+
+def load_sources(image_paths, pdf_paths, dpi):
+    """(label, encoded source bytes) for every image and PDF page."""
+    sources = []
+    for path in image_paths:
+        with open(path, "rb") as f:
+            sources.append((os.path.basename(path), f.read()))
+    for path in pdf_paths:
+        with fitz.open(path) as doc:
+            for page in doc:
+                sources.append((f"{os.path.basename(path)}#{page.number + 1}", page.get_pixmap(dpi=dpi).tobytes("png")))
+    return sources
+
+
+def encode_original(data: bytes) -> EncodedImage:
+    # Resize after decoding and re-save in the source format, as the app used to
+    pil_image = Image.open(io.BytesIO(data))
+    img_format = pil_image.format or "PNG"
+    pil_image.thumbnail(fit_size(*pil_image.size))
+    with io.BytesIO() as buffer:
+        pil_image.save(buffer, format=img_format)
+        return EncodedImage(buffer.getvalue(), f"image/{img_format.lower()}", pil_image.width, pil_image.height)
+
+
+def encode(data: bytes, config) -> EncodedImage:
+    return encode_original(data) if config is None else encode_pil(Image.open(io.BytesIO(data)), config)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run_encoding(name, config, sources, cohere_client, genai_client, api_samples, question) -> dict:
+    sizes, encode_times = [], []
+    for _, data in sources:
+        encoded, ms = timed(encode, data, config)
+        sizes.append(len(encoded.data_uri))
+        encode_times.append(ms)
+    row = {
+        "encoding": name,
+        "images": len(sources),
+        "payload_kb": round(statistics.mean(sizes) / 1024, 1),
+        "total_mb": round(sum(sizes) / 2**20, 2),
+        "encode_ms": round(statistics.median(encode_times), 1),
+    }
+
+    if cohere_client:
+        embed_times = []
+        for _, data in sources[:api_samples]:
+            def encode_and_embed():
+                uri = encode(data, config).data_uri
+                return cohere_client.embed(model="embed-v4.0", input_type="search_document", embedding_types=["float"],
+                                           inputs=[{"content": [{"type": "image_url", "image_url": {"url": uri}}]}])
+            embed_times.append(timed(encode_and_embed)[1])
+        row["embed_p50_ms"] = round(statistics.median(embed_times), 1)
+        row["embed_p95_ms"] = round(float(np.percentile(embed_times, 95)), 1)
+
+    if genai_client:
+        from google.genai import types
+
+        answer_times = []
+        for _, data in sources[:api_samples]:
+            def encode_and_answer():
+                encoded = encode(data, config)
+                part = types.Part.from_bytes(data=encoded.data, mime_type=encoded.mime_type)
+                return genai_client.models.generate_content(model="gemini-2.5-flash-preview-04-17",
+                                                            contents=[question, part])
+            answer_times.append(timed(encode_and_answer)[1])
+        row["answer_p50_ms"] = round(statistics.median(answer_times), 1)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Vision RAG image encodings")
+    parser.add_argument("--images", nargs="*", default=[], help="Image files")
+    parser.add_argument("--pdf", nargs="*", default=[], help="PDF files; every page is rendered")
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--encodings", nargs="+", default=list(ENCODINGS), choices=list(ENCODINGS))
+    parser.add_argument("--api-samples", type=int, default=3, help="Images per encoding sent to the APIs")
+    parser.add_argument("--question", default="Summarise the key figures shown in this image.")
+    args = parser.parse_args()
+
+    sources = load_sources(args.images, args.pdf, args.dpi)
+    if not sources:
+        parser.error("pass at least one image (--images) or PDF (--pdf)")
+
+    cohere_client = genai_client = None
+    if os.environ.get("COHERE_API_KEY"):
+        import cohere
+        cohere_client = cohere.ClientV2(api_key=os.environ["COHERE_API_KEY"])
+    if os.environ.get("GOOGLE_API_KEY"):
+        from google import genai
+        genai_client = genai.Client(api_key=os.environ["GOOGLE_API_KEY"])
+    if not (cohere_client or genai_client):
+        print("No COHERE_API_KEY or GOOGLE_API_KEY set: reporting payload size and encode time only.", file=sys.stderr)
+
+    rows = [run_encoding(name, ENCODINGS[name], sources, cohere_client, genai_client, args.api_samples, args.question)
+            for name in args.encodings]
+
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(row[c])) for row in rows)) for c in columns}
+    print(" | ".join(c.ljust(widths[c]) for c in columns))
+    print("-+-".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print(" | ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Single encode path for images sent to Cohere Embed-4 and Gemini.
+
+Every image is resized at most once, to fit MAX_PIXELS, and encoded to one
+compact format (JPEG or WebP at a quality setting, or PNG when lossless is
+needed). The embed and answer steps share the resulting bytes through
+`EncodedImageCache`, keyed by the content hash of the source and the
+encoding settings, so nothing is decoded, resized or re-encoded twice.
+
+Source bytes that already match the settings (same format, within
+MAX_PIXELS) pass through untouched. This is the case for PDF pages and uploads,
+which are written to disk already encoded.
+"""
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Tuple, Union
+
+from PIL import Image
+
+MAX_PIXELS = 1568 * 1568  # Max resolution for images
+FORMATS = ("JPEG", "WEBP", "PNG")
+
+
+@dataclass(frozen=True)
+class EncodeConfig:
+    format: str = "JPEG"
+    quality: int = 85  # Ignored for PNG
+    max_pixels: int = MAX_PIXELS
+
+    @property
+    def mime_type(self) -> str:
+        return f"image/{self.format.lower()}"
+
+    @property
+    def extension(self) -> str:
+        return {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}[self.format]
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+
+    @property
+    def data_uri(self) -> str:
+        return f"data:{self.mime_type};base64," + base64.b64encode(self.data).decode("utf-8")
+
+
+def fit_size(width: int, height: int, max_pixels: int = MAX_PIXELS) -> Tuple[int, int]:
+    """Largest size with the same aspect ratio that stays within max_pixels."""
+    if width * height <= max_pixels:
+        return width, height
+    scale = (max_pixels / (width * height)) ** 0.5
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def encode_pil(pil_image: Image.Image, config: EncodeConfig = EncodeConfig()) -> EncodedImage:
+    """Resize (if needed) and encode a PIL image in one pass."""
+    size = fit_size(*pil_image.size, config.max_pixels)
+    if pil_image.format == "JPEG" and size != pil_image.size:
+        # Let the JPEG decoder downscale by a power of two first, much cheaper than resizing at full size
+        pil_image.draft("RGB", size)
+    if size != pil_image.size:
+        pil_image = pil_image.resize(size, Image.LANCZOS)
+
+    if config.format == "JPEG" and pil_image.mode != "RGB":
+        if pil_image.mode in ("RGBA", "LA", "P"):
+            # JPEG has no alpha: flatten onto white, as the image would be displayed
+            rgba = pil_image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.split()[-1])
+            pil_image = background
+        else:
+            pil_image = pil_image.convert("RGB")
+
+    save_kwargs = {}
+    if config.format == "JPEG":
+        save_kwargs = {"quality": config.quality, "optimize": True}
+    elif config.format == "WEBP":
+        save_kwargs = {"quality": config.quality, "method": 4}
+    with io.BytesIO() as buffer:
+        pil_image.save(buffer, format=config.format, **save_kwargs)
+        data = buffer.getvalue()
+    return EncodedImage(data=data, mime_type=config.mime_type, width=pil_image.width, height=pil_image.height)
+
+
+def encode_bytes(data: bytes, config: EncodeConfig = EncodeConfig()) -> EncodedImage:
+    """Encode image file bytes, passing them through if they already match the config."""
+    pil_image = Image.open(io.BytesIO(data))
+    if pil_image.format == config.format and pil_image.width * pil_image.height <= config.max_pixels:
+        return EncodedImage(data=data, mime_type=config.mime_type, width=pil_image.width, height=pil_image.height)
+    return encode_pil(pil_image, config)
+
+
+def read_stored(path: str) -> EncodedImage:
+    """An indexed image file as it is, without re-encoding, so it matches the bytes that were embedded."""
+    with open(path, "rb") as f:
+        data = f.read()
+    pil_image = Image.open(io.BytesIO(data))
+    mime_type = Image.MIME.get(pil_image.format) or f"image/{pil_image.format.lower()}"
+    return EncodedImage(data=data, mime_type=mime_type, width=pil_image.width, height=pil_image.height)
+
+
+class EncodedImageCache:
+    """LRU of encoded images keyed by (source content hash, config), bounded by total bytes."""
+
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, EncodedImage]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, source: Union[str, bytes], config: EncodeConfig = EncodeConfig()) -> EncodedImage:
+        """Encoded image for a file path or file bytes, encoding it on a miss."""
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                source = f.read()
+        key = (hashlib.sha256(source).hexdigest(), config)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+
+        encoded = encode_bytes(source, config)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = encoded
+                self._size += len(encoded.data)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.data)
+        return encoded
@@ -0,0 +1,193 @@
+"""Pipelined PDF ingestion for Vision RAG.
+
+Pages move through three overlapping stages:
+
+1. Render: a process pool renders page ranges with PyMuPDF. The render DPI is
+   lowered up front for pages that would exceed MAX_PIXELS, so no resize pass
+   is needed.
+2. Encode: each page is encoded once, in the configured compact format (see
+   image_codec.py). The same bytes are written to disk, for display and
+   answering, and base64-encoded for the embed call.
+3. Embed: rendered pages are sent to Cohere Embed-4 in multi-image batches, on
+   a bounded thread pool, while the remaining pages are still rendering.
+
+Progress is reported through `on_progress(stage, done, total)` from the calling
+thread, so Streamlit widgets can be updated directly.
+
+Page images are named by content hash, `<output_folder>/<hash>.<ext>`, so a
+page keeps its file for as long as the persistent index points at it, whatever
+PDF it came from. Pages whose hash is in `known_hashes` (already in the page
+index) still have to be rendered to be hashed, but are not encoded, written or
+embedded again.
+"""
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from image_codec import EncodeConfig, encode_pil
+
+EMBED_MODEL = "embed-v4.0"
+
+ProgressCallback = Callable[[str, int, int], None]
+
+
+@dataclass
+class RenderedPage:
+    page_num: int
+    content_hash: str
+    path: str = ""  # Empty for known pages, which are not written
+    data_uri: str = ""
+
+
+@dataclass
+class PdfIngestResult:
+    paths: List[str] = field(default_factory=list)
+    hashes: List[str] = field(default_factory=list)
+    page_numbers: List[int] = field(default_factory=list)
+    embeddings: Optional[np.ndarray] = None
+    failed_pages: Dict[int, str] = field(default_factory=dict)
+    skipped_pages: List[int] = field(default_factory=list)
+
+
+def _page_dpi(page: "fitz.Page", dpi: int, max_pixels: int) -> int:
+    """Highest DPI up to `dpi` that keeps the rendered page within max_pixels."""
+    width_in, height_in = page.rect.width / 72, page.rect.height / 72
+    pixels = width_in * height_in * dpi * dpi
+    if pixels <= max_pixels:
+        return dpi
+    return int((max_pixels / (width_in * height_in)) ** 0.5)
+
+
+_worker_doc = None
+_worker_known_hashes: FrozenSet[str] = frozenset()
+
+
+def _init_render_worker(pdf_bytes: bytes, known_hashes: FrozenSet[str]):
+    # The PDF and the known hashes are sent to each worker once, rather than with every page range
+    global _worker_doc, _worker_known_hashes
+    _worker_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    _worker_known_hashes = known_hashes
+
+
+def _render_pages(page_indices: List[int], output_folder: str, dpi: int,
+                  encode_config: EncodeConfig) -> List[RenderedPage]:
+    """Worker: render a range of pages, encoding and writing each new one once and returning it as a data URI."""
+    rendered = []
+    for index in page_indices:
+        page = _worker_doc[index]
+        pix = page.get_pixmap(dpi=_page_dpi(page, dpi, encode_config.max_pixels))
+        # Hash the pixels rather than the encoded bytes, so the hash does not depend on the format
+        content_hash = hashlib.sha256(pix.samples).hexdigest()
+        if content_hash in _worker_known_hashes:
+            rendered.append(RenderedPage(page_num=index + 1, content_hash=content_hash))
+            continue
+        encoded = encode_pil(Image.frombytes("RGB", (pix.width, pix.height), pix.samples), encode_config)
+        path = os.path.join(output_folder, f"{content_hash}.{encode_config.extension}")
+        with open(path, "wb") as f:
+            f.write(encoded.data)
+        rendered.append(RenderedPage(page_num=index + 1, content_hash=content_hash, path=path,
+                                     data_uri=encoded.data_uri))
+    return rendered
+
+
+def embed_image_batch(cohere_client, data_uris: List[str]) -> List[np.ndarray]:
+    """Embed several images with one Embed-4 request."""
+    response = cohere_client.embed(
+        model=EMBED_MODEL,
+        input_type="search_document",
+        embedding_types=["float"],
+        inputs=[{"content": [{"type": "image_url", "image_url": {"url": uri}}]} for uri in data_uris],
+    )
+    vectors = response.embeddings.float if response.embeddings else None
+    if not vectors or len(vectors) != len(data_uris):
+        raise ValueError("Embed-4 returned no or misaligned embeddings")
+    return [np.asarray(vector) for vector in vectors]
+
+
+def ingest_pdf(pdf_bytes: bytes, cohere_client, output_folder: str, *, dpi: int = 150,
+               pages_per_task: int = 4, render_workers: Optional[int] = None,
+               embed_batch_size: int = 8, embed_concurrency: int = 4,
+               encode_config: EncodeConfig = EncodeConfig(), known_hashes: Iterable[str] = (),
+               on_progress: Optional[ProgressCallback] = None) -> PdfIngestResult:
+    """Render, encode and embed every page of a PDF.
+
+    Returns the page image paths, content hashes, page numbers and an
+    (n_pages, dim) embedding matrix in page order. Pages whose embed batch failed are listed in
+    `failed_pages`, and pages already in `known_hashes` in `skipped_pages`; both
+    are left out.
+    """
+    report_progress = on_progress or (lambda stage, done, total: None)
+    os.makedirs(output_folder, exist_ok=True)
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        num_pages = len(doc)
+    result = PdfIngestResult()
+    if num_pages == 0:
+        return result
+
+    ranges = [list(range(start, min(start + pages_per_task, num_pages)))
+              for start in range(0, num_pages, pages_per_task)]
+    workers = min(render_workers or os.cpu_count() or 1, len(ranges))
+    embedded: Dict[int, Tuple[RenderedPage, np.ndarray]] = {}
+    pending: List[RenderedPage] = []
+    rendered_count = embedded_count = 0
+
+    # Spawn rather than fork: the Streamlit server process holds threads and sockets.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_render_worker,
+                             initargs=(pdf_bytes, frozenset(known_hashes))) as render_pool, \
+            ThreadPoolExecutor(max_workers=embed_concurrency) as embed_pool:
+        render_futures = {render_pool.submit(_render_pages, pages, output_folder, dpi, encode_config): pages
+                          for pages in ranges}
+        embed_futures = {}
+
+        def submit_batch(batch: List[RenderedPage]):
+            future = embed_pool.submit(embed_image_batch, cohere_client, [p.data_uri for p in batch])
+            embed_futures[future] = batch
+            return future
+
+        outstanding = set(render_futures)
+        while outstanding:
+            done, outstanding = wait(outstanding, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in render_futures:
+                    try:
+                        for page in future.result():
+                            if not page.path:
+                                result.skipped_pages.append(page.page_num)
+                            else:
+                                pending.append(page)
+                    except Exception as e:
+                        for index in render_futures[future]:
+                            result.failed_pages[index + 1] = f"Render failed: {e}"
+                    rendered_count += len(render_futures[future])
+                    report_progress("Rendering", rendered_count, num_pages)
+                    renders_left = any(f in render_futures for f in outstanding)
+                    # Flush full batches as they fill, and the remainder once rendering is done
+                    while len(pending) >= embed_batch_size or (pending and not renders_left):
+                        batch, pending = pending[:embed_batch_size], pending[embed_batch_size:]
+                        outstanding.add(submit_batch(batch))
+                else:
+                    batch = embed_futures[future]
+                    try:
+                        for page, vector in zip(batch, future.result()):
+                            embedded[page.page_num] = (page, vector)
+                    except Exception as e:
+                        for page in batch:
+                            result.failed_pages[page.page_num] = f"Embedding failed: {e}"
+                    embedded_count += len(batch)
+                    report_progress("Embedding", embedded_count, num_pages - len(result.skipped_pages))
+
+    if embedded:
+        ordered = sorted(embedded)
+        result.paths = [embedded[page_num][0].path for page_num in ordered]
+        result.hashes = [embedded[page_num][0].content_hash for page_num in ordered]
+        result.page_numbers = ordered
+        result.embeddings = np.vstack([embedded[page_num][1] for page_num in ordered])
+    return result
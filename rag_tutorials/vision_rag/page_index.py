@@ -0,0 +1,146 @@
+"""Persistent, memory-mapped page-embedding index for Vision RAG.
+
+Layout of the index directory:
+
+- `embeddings.f32` (or `.f16`): raw row-major vectors, append-only. It is
+  memory-mapped read-only at startup, so loading costs no copy and no
+  re-embedding.
+- `manifest.json`: dimension, dtype and one entry per row with the image path,
+  the content hash of the image bytes and, optionally, a display label (e.g.
+  the PDF name and page number of a page image).
+
+The manifest is written atomically after the vectors. Rows beyond the
+manifest, left by an interrupted append, are ignored and then overwritten by
+the next append. Content hashes are used to skip images and pages that were
+embedded before, under any path.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, FrozenSet, List, Optional, Sequence
+
+import numpy as np
+
+MANIFEST_NAME = "manifest.json"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class PageEmbeddingIndex:
+    """Append-only embedding matrix on disk, aligned with a list of image paths."""
+
+    def __init__(self, index_dir: str, dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise ValueError("dtype must be float32 or float16")
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        os.makedirs(index_dir, exist_ok=True)
+
+        manifest = self._read_manifest()
+        self.dtype = np.dtype(manifest.get("dtype", dtype))
+        self.dim = manifest.get("dim")
+        self._entries: List[Dict[str, str]] = manifest.get("entries", [])
+        self._hashes = {entry["hash"]: i for i, entry in enumerate(self._entries)}
+        self._paths = [entry["path"] for entry in self._entries]
+        self._embeddings = self._map()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.index_dir, "embeddings.f16" if self.dtype == np.float16 else "embeddings.f32")
+
+    def _read_manifest(self) -> dict:
+        path = os.path.join(self.index_dir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        path = os.path.join(self.index_dir, MANIFEST_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "dtype": self.dtype.name, "entries": self._entries}, f)
+        os.replace(tmp_path, path)
+
+    def _map(self) -> np.ndarray:
+        rows = len(self._entries)
+        if not rows:
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        return np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def paths(self) -> List[str]:
+        return self._paths
+
+    @property
+    def labels(self) -> List[str]:
+        """Display label of each row, defaulting to the image file name."""
+        return [entry.get("label") or os.path.basename(entry["path"]) for entry in self._entries]
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """(n, dim) read-only view of the vectors, backed by the memory-mapped file."""
+        return self._embeddings
+
+    @property
+    def hashes(self) -> FrozenSet[str]:
+        return frozenset(self._hashes)
+
+    def contains(self, hash_: str) -> bool:
+        return hash_ in self._hashes
+
+    __contains__ = contains
+
+    def add(self, paths: Sequence[str], hashes: Sequence[str], embeddings,
+            labels: Optional[Sequence[str]] = None) -> int:
+        """Append rows whose content hash is not indexed yet. Returns the number added."""
+        embeddings = np.asarray(embeddings)
+        if not (len(paths) == len(hashes) == len(embeddings)) or (labels is not None and len(labels) != len(paths)):
+            raise ValueError("paths, hashes, embeddings and labels must be aligned")
+        with self._lock:
+            new_rows, seen = [], set()
+            for i, hash_ in enumerate(hashes):
+                if hash_ not in self._hashes and hash_ not in seen:
+                    seen.add(hash_)
+                    new_rows.append(i)
+            if not new_rows:
+                return 0
+
+            vectors = np.ascontiguousarray(embeddings[new_rows], dtype=self.dtype)
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the index ({self.dim})")
+
+            # Truncate to the committed rows first, dropping anything left by an interrupted append
+            committed_bytes = len(self._entries) * self.dim * self.dtype.itemsize
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(committed_bytes)
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            for i in new_rows:
+                self._hashes[hashes[i]] = len(self._entries)
+                entry = {"path": paths[i], "hash": hashes[i]}
+                if labels is not None:
+                    entry["label"] = labels[i]
+                self._entries.append(entry)
+                self._paths.append(paths[i])
+            self._write_manifest()
+            self._embeddings = self._map()
+            return len(new_rows)
+
+    def clear(self):
+        with self._lock:
+            self._entries, self._hashes, self._paths, self.dim = [], {}, [], None
+            if os.path.exists(self._vectors_path):
+                os.remove(self._vectors_path)
+            self._write_manifest()
+            self._embeddings = self._map()
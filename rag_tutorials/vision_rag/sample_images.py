@@ -0,0 +1,104 @@
+"""Concurrent, conditional download of the Vision RAG sample images.
+
+All images are fetched at once over one shared async HTTP client. An image
+already in the local folder is revalidated with the ETag / Last-Modified
+validators saved from its last download (If-None-Match / If-Modified-Since),
+so an unchanged image costs a 304 and no body. If the server cannot be
+reached, the local copy is used as-is.
+"""
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import httpx
+
+# Several images from https://www.appeconomyinsights.com/
+SAMPLE_IMAGES = {
+    "tesla.png": "https://substackcdn.com/image/fetch/w_1456,c_limit,f_webp,q_auto:good,fl_progressive:steep/https%3A%2F%2Fsubstack-post-media.s3.amazonaws.com%2Fpublic%2Fimages%2Fbef936e6-3efa-43b3-88d7-7ec620cdb33b_2744x1539.png",
+    "netflix.png": "https://substackcdn.com/image/fetch/w_1456,c_limit,f_webp,q_auto:good,fl_progressive:steep/https%3A%2F%2Fsubstack-post-media.s3.amazonaws.com%2Fpublic%2Fimages%2F23bd84c9-5b62-4526-b467-3088e27e4193_2744x1539.png",
+    "nike.png": "https://substackcdn.com/image/fetch/w_1456,c_limit,f_webp,q_auto:good,fl_progressive:steep/https%3A%2F%2Fsubstack-post-media.s3.amazonaws.com%2Fpublic%2Fimages%2Fa5cd33ba-ae1a-42a8-a254-d85e690d9870_2741x1541.png",
+    "google.png": "https://substackcdn.com/image/fetch/f_auto,q_auto:good,fl_progressive:steep/https%3A%2F%2Fsubstack-post-media.s3.amazonaws.com%2Fpublic%2Fimages%2F395dd3b9-b38e-4d1f-91bc-d37b642ee920_2741x1541.png",
+    "accenture.png": "https://substackcdn.com/image/fetch/w_1456,c_limit,f_webp,q_auto:good,fl_progressive:steep/https%3A%2F%2Fsubstack-post-media.s3.amazonaws.com%2Fpublic%2Fimages%2F08b2227c-7dc8-49f7-b3c5-13cab5443ba6_2741x1541.png",
+    "tecent.png": "https://substackcdn.com/image/fetch/w_1456,c_limit,f_webp,q_auto:good,fl_progressive:steep/https%3A%2F%2Fsubstack-post-media.s3.amazonaws.com%2Fpublic%2Fimages%2F0ec8448c-c4d1-4aab-a8e9-2ddebe0c95fd_2741x1541.png",
+}
+
+VALIDATORS_NAME = ".validators.json"
+
+
+@dataclass
+class FetchResult:
+    name: str
+    path: Optional[str]  # None if the image is not available locally
+    status: str  # "downloaded", "not_modified", "offline_copy" or "failed"
+    error: str = ""
+
+
+def _load_validators(folder: str) -> Dict[str, Dict[str, str]]:
+    path = os.path.join(folder, VALIDATORS_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_validators(folder: str, validators: Dict[str, Dict[str, str]]):
+    path = os.path.join(folder, VALIDATORS_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(validators, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+async def _fetch(client: httpx.AsyncClient, name: str, url: str, folder: str,
+                 validators: Dict[str, Dict[str, str]]) -> FetchResult:
+    path = os.path.join(folder, name)
+    have_local = os.path.exists(path)
+    headers = {}
+    if have_local:
+        saved = validators.get(name, {})
+        if saved.get("etag"):
+            headers["If-None-Match"] = saved["etag"]
+        if saved.get("last_modified"):
+            headers["If-Modified-Since"] = saved["last_modified"]
+
+    try:
+        response = await client.get(url, headers=headers)
+        if response.status_code == 304 and have_local:
+            return FetchResult(name, path, "not_modified")
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        if have_local:
+            return FetchResult(name, path, "offline_copy", str(e))
+        return FetchResult(name, None, "failed", str(e))
+
+    # Write to a temporary file first, so an interrupted download never replaces a good copy
+    with open(path + ".part", "wb") as f:
+        f.write(response.content)
+    os.replace(path + ".part", path)
+    validators[name] = {
+        "etag": response.headers.get("ETag", ""),
+        "last_modified": response.headers.get("Last-Modified", ""),
+    }
+    return FetchResult(name, path, "downloaded")
+
+
+async def fetch_images(images: Dict[str, str], folder: str, timeout: float = 30.0) -> List[FetchResult]:
+    """Download or revalidate every image concurrently. Results are in the order of `images`."""
+    os.makedirs(folder, exist_ok=True)
+    validators = _load_validators(folder)
+    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+        results = await asyncio.gather(
+            *(_fetch(client, name, url, folder, validators) for name, url in images.items())
+        )
+    if any(result.status == "downloaded" for result in results):
+        _save_validators(folder, validators)
+    return list(results)
+
+
+def fetch_sample_images(folder: str = "img") -> List[FetchResult]:
+    """Synchronous entry point for the Streamlit script thread, which has no running event loop."""
+    return asyncio.run(fetch_images(SAMPLE_IMAGES, folder))
@@ -0,0 +1,105 @@
+"""Top-k page search for Vision RAG.
+
+The engine keeps its own L2-normalised float32 copy of the page embeddings, so
+a query costs one matrix-vector product and scores are true cosine
+similarities, whatever the index stores. New pages are normalised
+incrementally as the page index grows.
+
+- Exact search: `np.argpartition` picks the top k in O(n), then only those k
+  are sorted.
+- Approximate search: once the index holds `ann_threshold` pages, and if
+  `hnswlib` is installed, an HNSW graph is built and kept up to date with
+  appended pages. Below the threshold, exact search is fast enough and
+  always correct.
+"""
+import threading
+from typing import List, Tuple
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # Optional: exact search is used without it
+    hnswlib = None
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class PageSearchEngine:
+    """Cosine top-k over page embeddings, exact or HNSW depending on size."""
+
+    def __init__(self, ann_threshold: int = 20000, hnsw_m: int = 16,
+                 hnsw_ef_construction: int = 200, hnsw_ef: int = 128):
+        self.ann_threshold = ann_threshold
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef = hnsw_ef
+        self._lock = threading.Lock()
+        self._matrix = np.empty((0, 0), dtype=np.float32)  # Grows by doubling; rows past _size are unused
+        self._size = 0
+        self._hnsw = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def uses_ann(self) -> bool:
+        return self._hnsw is not None
+
+    def sync(self, embeddings: np.ndarray):
+        """Bring the engine up to date with the page index, normalising only new rows."""
+        with self._lock:
+            rows = len(embeddings)
+            if rows < self._size or (rows and self._size and embeddings.shape[1] != self._matrix.shape[1]):
+                # The index was cleared or rebuilt: start over
+                self._matrix, self._size, self._hnsw = np.empty((0, 0), dtype=np.float32), 0, None
+            if rows == self._size:
+                return
+
+            new_rows = normalize_rows(embeddings[self._size:rows])
+            if rows > len(self._matrix):
+                grown = np.empty((max(rows, 2 * len(self._matrix)), new_rows.shape[1]), dtype=np.float32)
+                if self._size:
+                    grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown
+            self._matrix[self._size:rows] = new_rows
+
+            if self._hnsw is not None:
+                if rows > self._hnsw.get_max_elements():
+                    self._hnsw.resize_index(2 * rows)
+                self._hnsw.add_items(new_rows, np.arange(self._size, rows))
+            elif hnswlib is not None and rows >= self.ann_threshold:
+                self._hnsw = self._build_hnsw(rows)
+            self._size = rows
+
+    def _build_hnsw(self, rows: int):
+        index = hnswlib.Index(space="ip", dim=self._matrix.shape[1])  # Inner product on unit vectors
+        index.init_index(max_elements=2 * rows, M=self.hnsw_m, ef_construction=self.hnsw_ef_construction)
+        index.add_items(self._matrix[:rows], np.arange(rows))
+        index.set_ef(self.hnsw_ef)
+        return index
+
+    def search(self, query_embedding: np.ndarray, k: int = 1) -> List[Tuple[int, float]]:
+        """Return up to k (row, cosine similarity) pairs, best first."""
+        query = normalize_rows(query_embedding)
+        k = min(k, self._size)
+        if k <= 0:
+            return []
+        if query.shape[0] != self._matrix.shape[1]:
+            raise ValueError(f"Query embedding dimension ({query.shape[0]}) does not match "
+                             f"document embedding dimension ({self._matrix.shape[1]}).")
+
+        if self._hnsw is not None:
+            self._hnsw.set_ef(max(self.hnsw_ef, k))
+            labels, distances = self._hnsw.knn_query(query, k=k)
+            # hnswlib's "ip" distance is 1 - inner product
+            return [(int(label), float(1 - distance)) for label, distance in zip(labels[0], distances[0])]
+
+        scores = self._matrix[:self._size] @ query
+        top = np.argpartition(-scores, k - 1)[:k] if k < self._size else np.arange(self._size)
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]